@@ -0,0 +1,78 @@
+"""Configuration space benchmark
+
+Compares the cost of growing the obstacles of `raw_map.npy` for path
+planning with the original `convolve2d` over the whole map, with
+`utils.grid.box_sum` over the whole map, and with `utils.grid.Inflation`
+updating only the tiles that changed. The changes are an obstacle the size
+of a cart moving down an aisle. All three are checked to give the same
+configuration space.
+
+This does not need webots. Run it from the controller directory:
+```
+python benchmarks/bench_cspace.py
+```
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np  # noqa: E402
+from scipy.signal import convolve2d  # noqa: E402
+from utils.grid import box_sum, Inflation  # noqa: E402
+
+CONV_SIZE = 15
+THRESHOLD = 0.01
+CART_SIZE = 6  # cells
+
+
+def convolve_cspace(map_data):
+    adj_map = convolve2d(map_data, np.ones((CONV_SIZE, CONV_SIZE)), mode='same',
+                         boundary='fill', fillvalue=1)
+    return (adj_map > (CONV_SIZE**2 * THRESHOLD)) * 1
+
+
+def box_sum_cspace(map_data):
+    return (box_sum(map_data, CONV_SIZE, 1) > CONV_SIZE**2 * THRESHOLD) * 1
+
+
+def moving_cart(map_data, count=100):
+    """Copies of `map_data` with a cart moved one cell along x in each."""
+    maps = []
+    for i in range(count):
+        data = map_data.copy()
+        data[248:248 + CART_SIZE, 120 + i:120 + i + CART_SIZE] = 1
+        maps.append(data)
+    return maps
+
+
+def run(cspace, maps):
+    results = []
+    start = time.perf_counter()
+    for data in maps:
+        results.append(cspace(data).copy())
+    return results, (time.perf_counter() - start) / len(maps)
+
+
+if __name__ == '__main__':
+    map_data = (np.load(os.path.join(os.path.dirname(__file__), '..',
+                                     'raw_map.npy')) > 0.7) * 1
+    maps = moving_cart(map_data)
+
+    expected, convolve = run(convolve_cspace, maps)
+    actual, separable = run(box_sum_cspace, maps)
+    assert all(np.array_equal(a, b) for a, b in zip(expected, actual))
+
+    inflation = Inflation(CONV_SIZE, THRESHOLD)
+    inflation.update(map_data)
+    actual, incremental = run(inflation.update, maps)
+    assert all(np.array_equal(a, b) for a, b in zip(expected, actual))
+
+    print(f'{map_data.shape[1]}x{map_data.shape[0]} map, {CONV_SIZE}x{CONV_SIZE} '
+          f'square, {len(maps)} updates, configuration spaces match')
+    print(f'convolve2d:  {convolve * 1e3:8.2f} ms/update')
+    print(f'box_sum:     {separable * 1e3:8.2f} ms/update '
+          f'({convolve / separable:.0f}x faster)')
+    print(f'incremental: {incremental * 1e3:8.2f} ms/update '
+          f'({convolve / incremental:.0f}x faster)')
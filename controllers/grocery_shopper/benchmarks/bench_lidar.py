@@ -0,0 +1,96 @@
+"""Lidar benchmark
+
+Compares the per tick cost of converting a lidar scan to world coordinates
+with a python loop (the original `sensors/lidar.py` code) and with
+`utils.scan.scan_to_world`, and checks both produce the same points.
+It also reports how many points `utils.scan.voxel_downsample` keeps at
+the mapping cell size and the cost of the `utils.scan.sector_min`
+clearance check, which runs on the control thread every tick.
+
+This does not need webots. Run it from the controller directory:
+```
+python benchmarks/bench_lidar.py
+```
+"""
+import math
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np  # noqa: E402
+from utils.scan import scan_to_world, voxel_downsample, \
+    sector_slices, sector_min  # noqa: E402
+
+LIDAR_ANGLE_BINS = 667
+LIDAR_SENSOR_MAX_RANGE = 8
+LIDAR_ANGLE_RANGE = math.radians(240)
+MAP_CELL_SIZE = 30 / 360
+
+lidar_offsets = np.linspace(
+    +LIDAR_ANGLE_RANGE / 2.0, -LIDAR_ANGLE_RANGE / 2.0, LIDAR_ANGLE_BINS
+)[83: LIDAR_ANGLE_BINS - 83]
+cos_offsets = np.cos(lidar_offsets)
+sin_offsets = np.sin(lidar_offsets)
+
+
+def loop_scan_to_world(ranges, pose):
+    pose_x, pose_y, pose_theta = pose
+    readings = []
+    for alpha, rho in zip(lidar_offsets, ranges):
+        if rho > LIDAR_SENSOR_MAX_RANGE:
+            continue
+
+        rx = math.cos(alpha) * rho + 0.202
+        ry = math.sin(alpha) * rho - 0.004
+
+        wx = math.cos(pose_theta) * rx - math.sin(pose_theta) * ry + pose_x
+        wy = math.sin(pose_theta) * rx + math.cos(pose_theta) * ry + pose_y
+
+        readings.append([wx, wy])
+    return readings
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    ranges = rng.uniform(0.1, 12, len(lidar_offsets))
+    ranges[rng.random(len(ranges)) < 0.1] = np.inf
+    # webots returns a python list
+    ranges = ranges.tolist()
+    pose = (3.2, -1.5, 0.7)
+
+    expected = np.array(loop_scan_to_world(ranges, pose))
+    actual = scan_to_world(ranges, cos_offsets, sin_offsets,
+                           pose, LIDAR_SENSOR_MAX_RANGE)
+    assert expected.shape == actual.shape
+    assert np.allclose(expected, actual, rtol=0, atol=1e-9)
+
+    number = 2_000
+    loop = timeit.timeit(lambda: loop_scan_to_world(ranges, pose),
+                         number=number) / number
+    vectorized = timeit.timeit(
+        lambda: scan_to_world(ranges, cos_offsets, sin_offsets,
+                              pose, LIDAR_SENSOR_MAX_RANGE),
+        number=number) / number
+
+    print(f'{len(expected)} of {len(ranges)} beams in range, points match')
+    print(f'python loop: {loop * 1e6:8.1f} us/tick')
+    print(f'vectorized:  {vectorized * 1e6:8.1f} us/tick '
+          f'({loop / vectorized:.1f}x faster)')
+
+    downsampled = voxel_downsample(actual, MAP_CELL_SIZE)
+    voxel = timeit.timeit(lambda: voxel_downsample(actual, MAP_CELL_SIZE),
+                          number=number) / number
+    print(f'voxel downsample: {voxel * 1e6:8.1f} us/tick, '
+          f'{len(actual)} -> {len(downsampled)} points')
+
+    sectors = [(math.radians(20), math.radians(60)),
+               (math.radians(-20), math.radians(20)),
+               (math.radians(-60), math.radians(-20))]
+    slices = sector_slices(lidar_offsets, sectors)
+    raw = np.array(ranges, dtype=np.float32)
+    clearance = timeit.timeit(lambda: sector_min(raw, slices),
+                              number=number) / number
+    print(f'sector clearance: {clearance * 1e6:8.1f} us/tick, '
+          f'{np.round(sector_min(raw, slices), 2)}')
@@ -0,0 +1,179 @@
+"""Scan matching benchmark
+
+Measures how long `utils.scan_match.match_scan` takes per scan and how well
+it recovers the pose, matching against the saved map in `raw_map.npy`.
+Matches go through the same checks as `service/localization`, so the
+report includes how often it falls back to the GPS and the error of the
+GPS baseline next to the error of the published pose.
+
+Without arguments scans are simulated by casting rays through the map from
+random free poses, and the GPS is the true pose plus noise.
+Given a recording made with `bus.record` that includes
+'/bot/sensor/lidar_raw', the recorded scans are matched instead, starting
+from the pose they were taken at. The GPS is exact in webots, so the
+correction is the error of the match.
+
+This does not need webots. Run it from the controller directory:
+```
+python benchmarks/bench_localization.py [run.bag]
+```
+"""
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np  # noqa: E402
+from utils.scan import scan_to_robot, robot_to_world  # noqa: E402
+from utils.scan_match import DistanceField, match_scan, constrain  # noqa: E402
+
+LIDAR_ANGLE_BINS = 667
+LIDAR_SENSOR_MAX_RANGE = 8
+LIDAR_ANGLE_RANGE = math.radians(240)
+MAP_DIM = 360
+CELL_SIZE = 30 / MAP_DIM
+ORIGIN = (MAP_DIM / 2, MAP_DIM / 2)
+
+# the checks of service/localization
+MIN_QUALITY = 0.6
+MAX_CORRECTION = 0.5  # Meter
+MAX_HEADING_CORRECTION = math.radians(10)
+MIN_INFORMATION = 0.01
+
+lidar_offsets = np.linspace(
+    +LIDAR_ANGLE_RANGE / 2.0, -LIDAR_ANGLE_RANGE / 2.0, LIDAR_ANGLE_BINS
+)[83: LIDAR_ANGLE_BINS - 83]
+cos_offsets = np.cos(lidar_offsets)
+sin_offsets = np.sin(lidar_offsets)
+
+
+def cast_scan(occupied, pose, rng):
+    """Ranges seen from `pose`, marching every beam through the grid."""
+    steps = np.arange(0, LIDAR_SENSOR_MAX_RANGE, CELL_SIZE / 4)
+    beams = np.stack([np.outer(steps, cos_offsets),
+                      np.outer(steps, sin_offsets)], axis=-1)
+    # lidar is in front of the robot center
+    beams[..., 0] += 0.202
+    beams[..., 1] -= 0.004
+    world = robot_to_world(beams.reshape(-1, 2), pose)
+    cols = (world[:, 0] / CELL_SIZE + ORIGIN[0]).astype(int)
+    rows = (world[:, 1] / CELL_SIZE + ORIGIN[1]).astype(int)
+    inside = (cols >= 0) & (cols < MAP_DIM) & (rows >= 0) & (rows < MAP_DIM)
+    hit = np.zeros(len(world), dtype=bool)
+    hit[inside] = occupied[rows[inside], cols[inside]]
+    hit = hit.reshape(len(steps), -1)
+
+    first = np.argmax(hit, axis=0)
+    ranges = np.where(hit.any(axis=0), steps[first], np.inf)
+    return ranges + rng.normal(0, 0.01, len(ranges))
+
+
+def localize(field, points, gps_pose):
+    """
+    Match a scan starting from the GPS and check it like `service/localization`.
+
+    :return: (pose, quality, constrained) - the published pose, the match
+    quality and the number of position directions corrected by the match,
+    -1 when the GPS is used instead
+    """
+    pose, quality, information = match_scan(field, points, gps_pose)
+    pose, constrained = constrain(pose, gps_pose, information, MIN_INFORMATION)
+    correction, heading_correction = error(pose, gps_pose)
+    if quality >= MIN_QUALITY and constrained > 0 and \
+            correction <= MAX_CORRECTION and \
+            heading_correction <= MAX_HEADING_CORRECTION:
+        return pose, quality, constrained
+    return np.array(gps_pose, dtype=np.float64), quality, -1
+
+
+def report_error(name, errors):
+    print(f'  {name} position error median {np.median(errors[:, 0]) * 100:.1f} cm, '
+          f'95% {np.percentile(errors[:, 0], 95) * 100:.1f} cm, '
+          f'heading median {math.degrees(np.median(errors[:, 1])):.2f} deg, '
+          f'95% {math.degrees(np.percentile(errors[:, 1], 95)):.2f} deg')
+
+
+def report(name, times, errors, qualities, constrained, gps_errors=None):
+    times = np.array(times) * 1e6
+    constrained = np.array(constrained)
+    print(f'{name}: {len(times)} scans, '
+          f'{np.median(times):6.0f} us/match median, {times.max():6.0f} us max')
+    print(f'  quality median {np.median(qualities):.2f}, '
+          f'min {np.min(qualities):.2f}')
+    print(f'  gps fallback {np.mean(constrained == -1) * 100:.0f}%, '
+          f'position corrected along 1 axis {np.mean(constrained == 1) * 100:.0f}%, '
+          f'2 axes {np.mean(constrained == 2) * 100:.0f}%')
+    if gps_errors is not None:
+        errors = np.array(errors)
+        gps_errors = np.array(gps_errors)
+        report_error('gps', gps_errors)
+        report_error('pose', errors)
+        print(f'  pose further from the truth than the gps '
+              f'{np.mean(errors[:, 0] > gps_errors[:, 0] + 1e-9) * 100:.0f}%')
+    else:
+        # the webots GPS is exact, so the correction is the error
+        report_error('pose', np.array(errors))
+
+
+def simulated(field, occupied, count=200):
+    rng = np.random.default_rng(0)
+    free = np.argwhere(field.distance > 0.4)
+    times, errors, qualities, constrained, gps_errors = [], [], [], [], []
+    while len(times) < count:
+        row, col = free[rng.integers(len(free))]
+        true_pose = np.array([(col + 0.5 - ORIGIN[0]) * CELL_SIZE,
+                              (row + 0.5 - ORIGIN[1]) * CELL_SIZE,
+                              rng.uniform(-math.pi, math.pi)])
+        ranges = cast_scan(occupied, true_pose, rng)
+        points = scan_to_robot(ranges, cos_offsets, sin_offsets,
+                               LIDAR_SENSOR_MAX_RANGE)
+        if len(points) < 50:
+            continue
+        gps_pose = true_pose + [*rng.normal(0, 0.1, 2), rng.normal(0, 0.05)]
+
+        start = time.perf_counter()
+        pose, quality, directions = localize(field, points, gps_pose)
+        times.append(time.perf_counter() - start)
+        errors.append(error(pose, true_pose))
+        gps_errors.append(error(gps_pose, true_pose))
+        qualities.append(quality)
+        constrained.append(directions)
+    report('simulated', times, errors, qualities, constrained, gps_errors)
+
+
+def recorded(field, path):
+    import bus_bag
+    times, errors, qualities, constrained = [], [], [], []
+    for _, _, _, scan in bus_bag.read(path, ['/bot/sensor/lidar_raw']):
+        points = scan_to_robot(scan.ranges, scan.cos_offsets,
+                               scan.sin_offsets, scan.max_range)
+        start = time.perf_counter()
+        pose, quality, directions = localize(field, points, scan.pose)
+        times.append(time.perf_counter() - start)
+        errors.append(error(pose, scan.pose))
+        qualities.append(quality)
+        constrained.append(directions)
+    if not times:
+        sys.exit(f'{path} has no /bot/sensor/lidar_raw messages')
+    report('recorded', times, errors, qualities, constrained)
+
+
+def error(pose, true_pose):
+    dtheta = (pose[2] - true_pose[2] + math.pi) % (2 * math.pi) - math.pi
+    return math.hypot(pose[0] - true_pose[0], pose[1] - true_pose[1]), abs(dtheta)
+
+
+if __name__ == '__main__':
+    occupied = np.load(os.path.join(os.path.dirname(__file__), '..',
+                                    'raw_map.npy')) > 0.7
+
+    start = time.perf_counter()
+    field = DistanceField(occupied, CELL_SIZE, ORIGIN)
+    print(f'distance field: {(time.perf_counter() - start) * 1e3:.1f} ms')
+
+    if len(sys.argv) > 1:
+        recorded(field, sys.argv[1])
+    else:
+        simulated(field, occupied)
@@ -0,0 +1,106 @@
+"""Mapping benchmark
+
+Compares the per scan cost of accumulating lidar points into the raw map
+with a python loop (the original `ManualMapper.update` code, without
+drawing) and with `utils.grid`, and checks both build the same map.
+
+Without arguments the scans are simulated by casting rays through
+`raw_map.npy` from poses along a drive through the store. Given a
+recording made with `bus.record` that includes '/bot/sensor/lidar', the
+recorded scans are used instead.
+
+This does not need webots. Run it from the controller directory:
+```
+python benchmarks/bench_mapping.py [run.bag]
+```
+"""
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np  # noqa: E402
+from utils.grid import GridMap, accumulate  # noqa: E402
+from utils.scan import scan_to_world  # noqa: E402
+from bench_localization import cast_scan, cos_offsets, sin_offsets, \
+    LIDAR_SENSOR_MAX_RANGE  # noqa: E402
+
+WORLD_WIDTH = 30
+DISPLAY_DIM = 360
+HIT_INCREMENT = 5e-3
+GRID = GridMap(-WORLD_WIDTH / 2, WORLD_WIDTH / 2, -WORLD_WIDTH / 2,
+               WORLD_WIDTH / 2, WORLD_WIDTH / DISPLAY_DIM)
+
+
+def coords_world_to_map(pos):
+    x, y = pos
+    new_x = int((x / WORLD_WIDTH + 0.5) * DISPLAY_DIM)
+    new_y = int((y / WORLD_WIDTH + 0.5) * DISPLAY_DIM)
+    if new_x < 0 or new_x >= DISPLAY_DIM:
+        raise Exception('x out of bounds')
+    if new_y < 0 or new_y >= DISPLAY_DIM:
+        raise Exception('y out of bounds')
+    return new_x, new_y
+
+
+def loop_update(raw_map, readings):
+    readings = [coords_world_to_map(pos) for pos in readings]
+    for x, y in readings:
+        g = raw_map[y][x] + HIT_INCREMENT
+        g = raw_map[y][x] = max(0, min(1, g))
+
+
+def vectorized_update(raw_map, readings):
+    indexes, valid = GRID.world_to_map(readings)
+    accumulate(raw_map, indexes[valid], HIT_INCREMENT)
+
+
+def simulated_scans(count=300):
+    occupied = np.load(os.path.join(os.path.dirname(__file__), '..',
+                                    'raw_map.npy')) > 0.7
+    rng = np.random.default_rng(0)
+    scans = []
+    # drive down an aisle, turning slowly
+    for i in range(count):
+        pose = (-5 + 18 * i / count, 5.65, 0.3 * math.sin(i / 20))
+        ranges = cast_scan(occupied, pose, rng)
+        scans.append(scan_to_world(ranges, cos_offsets, sin_offsets,
+                                   pose, LIDAR_SENSOR_MAX_RANGE))
+    return scans
+
+
+def recorded_scans(path):
+    import bus_bag
+    scans = [data for _, _, _, data in bus_bag.read(path, ['/bot/sensor/lidar'])]
+    if not scans:
+        sys.exit(f'{path} has no /bot/sensor/lidar messages')
+    return scans
+
+
+def run(update, scans):
+    raw_map = np.zeros((DISPLAY_DIM, DISPLAY_DIM))
+    start = time.perf_counter()
+    for readings in scans:
+        update(raw_map, readings)
+    return raw_map, (time.perf_counter() - start) / len(scans)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        scans = recorded_scans(sys.argv[1])
+    else:
+        scans = simulated_scans()
+    # the original code raised on points outside of the map
+    scans = [s[GRID.world_to_map(s)[1]] for s in scans]
+
+    expected, loop = run(loop_update, scans)
+    actual, vectorized = run(vectorized_update, scans)
+    assert np.allclose(expected, actual, rtol=0, atol=1e-12)
+
+    points = sum(len(s) for s in scans) / len(scans)
+    print(f'{len(scans)} scans, {points:.0f} points per scan, maps match')
+    print(f'python loop: {loop * 1e6:8.1f} us/scan')
+    print(f'vectorized:  {vectorized * 1e6:8.1f} us/scan '
+          f'({loop / vectorized:.1f}x faster)')
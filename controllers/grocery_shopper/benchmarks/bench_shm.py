@@ -0,0 +1,91 @@
+"""Shared memory transport benchmark
+
+Sends `/bot/pose` and lidar scans from this process to a second python
+process through `bus_shm`, checks the received data and reports
+messages/sec. The second process is started as a separate interpreter
+running this file with the `consumer` argument.
+
+This does not need webots. Run it from the controller directory:
+```
+python benchmarks/bench_shm.py
+```
+"""
+import os
+import sys
+import time
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np  # noqa: E402
+import bus  # noqa: E402
+import bus_shm  # noqa: E402
+
+MESSAGES = 20_000
+SCAN_POINTS = 500
+
+
+def consumer():
+    """Runs in the second process."""
+    poses = []
+    scans = []
+    bus.Subscriber('/bot/pose', np.ndarray, poses.append, name='consumer')
+    bus.Subscriber('/bot/sensor/lidar', np.ndarray,
+                   scans.append, name='consumer')
+
+    pose_import = bus_shm.import_topic('/bot/pose', np.ndarray,
+                                       'bench_pose', from_start=True)
+    scan_import = bus_shm.import_topic('/bot/sensor/lidar', np.ndarray,
+                                       'bench_lidar', from_start=True)
+    print('ready', flush=True)
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        pose_import.poll()
+        scan_import.poll()
+        if poses and poses[-1][0] == MESSAGES - 1 and scans and scans[-1][0, 0] == MESSAGES - 1:
+            break
+
+    ordered = all(a[0] < b[0] for a, b in zip(poses, poses[1:]))
+    print(len(poses), len(scans), pose_import.dropped,
+          scan_import.dropped, ordered, flush=True)
+    pose_import.close()
+    scan_import.close()
+
+
+def producer():
+    pose_export = bus_shm.export_topic('/bot/pose', np.ndarray, 'bench_pose',
+                                       slots=1024, dtype=np.float64)
+    scan_export = bus_shm.export_topic('/bot/sensor/lidar', np.ndarray, 'bench_lidar',
+                                       slots=64, slot_size=SCAN_POINTS * 2 * 8, dtype=np.float64)
+    pose_pub = bus.Publisher('/bot/pose', np.ndarray, name='bench')
+    scan_pub = bus.Publisher('/bot/sensor/lidar', np.ndarray, name='bench')
+
+    process = subprocess.Popen([sys.executable, __file__, 'consumer'],
+                               stdout=subprocess.PIPE, text=True)
+    process.stdout.readline()
+
+    scan = np.random.rand(SCAN_POINTS, 2)
+    start = time.perf_counter()
+    for i in range(MESSAGES):
+        pose_pub.publish(np.array([i, 1.0, 2.0]))
+        scan[0, 0] = i
+        scan_pub.publish(scan)
+    elapsed = time.perf_counter() - start
+
+    poses, scans, pose_dropped, scan_dropped, ordered = process.stdout.readline().split()
+    process.wait()
+    pose_export.close()
+    scan_export.close()
+
+    print(f'published {MESSAGES} poses and scans in {elapsed:.2f}s '
+          f'({MESSAGES / elapsed:,.0f} msg/s per topic)')
+    print(f'pose: received {poses}, dropped {pose_dropped}, ordered {ordered}')
+    print(f'lidar: received {scans}, dropped {scan_dropped}')
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['consumer']:
+        consumer()
+    else:
+        producer()
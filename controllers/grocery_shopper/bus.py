@@ -14,44 +14,382 @@ This module provides 2 main classes:
 - Publisher: used to send data into the bus.
 - Subscriber: used to consume data from the bus.
     - subscribe: helper function for creating subscribers.
+    - unsubscribe: remove a subscriber by name.
+
+Subscribers can use a pattern instead of a topic name to receive data from
+every matching topic, including topics created later (`PatternSubscriber`):
+- `*` matches one level, e.g. `/bot/sensor/*` matches `/bot/sensor/lidar`.
+- `**` matches any number of levels, e.g. `/bot/**` matches every bot topic.
+Patterns are matched when topics and subscribers are created, so publishing
+is just as fast as for normal subscribers.
+
+Short lived publishers and subscribers should call `unregister` and
+`unsubscribe` when they are done so the topic does not keep them alive.
 
 It also provides some debugging utilities:
 - describe_topic
 - describe_node
 - get_topics
 - publish_once
+- record / replay: save traffic to a file and play it back, see `bus_bag`.
+
+Each topic keeps the last few messages and replays them to subscribers
+that register late. The replay depth can be set per topic with `queue_size`
+when creating a publisher or subscriber:
+- 0 for streaming data such as sensor readings, nothing is replayed.
+- 1 for latched state such as `/bot/pose`, only the latest value is replayed.
+- N for command history.
+
+By default publishing calls every subscriber immediately, so a subscriber
+that publishes causes nested calls. In deferred mode (`set_deferred_mode`)
+published messages are queued instead and delivered in publish order when
+`flush` is called, which the main loop does at the end of every tick.
+Topics created with `latest_only=True` only deliver the last message
+published to them before a flush, this is used for wheel commands where
+only the final value of a tick matters.
+
+Subscribers normally run inline on the thread that publishes. Slow
+subscribers can pass a `policy` to run somewhere else:
+- INLINE: call the subscriber directly (default).
+- THREAD_POOL: submit each message to a shared thread pool.
+- WORKER: a dedicated thread with a bounded queue, when the queue is full
+the oldest message is dropped.
+`describe_topic` prints the queue depth of these subscribers, and the drop
+count of WORKER subscribers. The thread pool never drops messages.
+Note that webots devices should only be used from the main thread.
+
+Timing of subscribers can be recorded with `set_stats_enabled`. `stats`
+returns call counts and wall times per subscriber and message rates per
+topic, and the numbers are periodically written to the debug log file.
+Only a flag is checked when stats are disabled. THREAD_POOL and WORKER
+subscribers are timed on the thread that runs them, so their numbers are
+the time spent in the callback rather than in handing the message over.
+
+Topics carrying numpy arrays can declare a `Schema` (dtype and shape) when
+creating a publisher or subscriber. Published arrays are checked against it,
+so subscribers can rely on the layout. Schemas for the robot topics are in
+`messages.py`.
+
+Type checking of published data can be turned off with `set_release_mode`
+once the controller is known to work, which removes an `isinstance` call
+from every broadcast.
 """
 
 
 import sys
 import os
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import TypeVar, Callable, Generic
 T = TypeVar('T')
 
+logger = logging.getLogger(__name__)
+stats_logger = logging.getLogger(__name__ + '.stats')
+
+# default number of messages a topic keeps to replay to late subscribers
+QUEUE_SIZE = 10
+
+# when True, `Topic.broadcast` skips checking the type of published data
+release_mode = False
+
+
+def set_release_mode(enabled: bool = True):
+    """Enable or disable release mode.
+
+    In release mode the bus trusts publishers and does not type check data.
+    """
+    global release_mode
+    release_mode = enabled
+
+
+class Schema:
+    """Describes the numpy arrays sent to a topic.
 
-def currentframe(): return sys._getframe(1)
+    `dtype` can be a plain or structured numpy dtype. `shape` is the
+    expected array shape, `None` allows any size for that dimension.
 
+    Example:
+    ```
+    # any number of (x, y) points
+    Schema(np.dtype([('x', np.float64), ('y', np.float64)]), (None,))
+    # a 3 float vector
+    Schema(np.dtype(np.float64), (3,))
+    ```
+    """
+
+    def __init__(self, dtype, shape: tuple):
+        self.dtype = dtype
+        self.shape = tuple(shape)
+
+    def __repr__(self):
+        return f'Schema({self.dtype}, {self.shape})'
+
+    def __eq__(self, other):
+        return isinstance(other, Schema) and \
+            self.dtype == other.dtype and self.shape == other.shape
+
+    def matches(self, data) -> bool:
+        """Returns True if `data` is an array with this dtype and shape."""
+        dtype = getattr(data, 'dtype', None)
+        shape = getattr(data, 'shape', None)
+        if dtype != self.dtype or shape is None or len(shape) != len(self.shape):
+            return False
+        for size, expected in zip(shape, self.shape):
+            if expected is not None and size != expected:
+                return False
+        return True
+
+
+# when True, `Topic.broadcast` queues data until `flush` is called
+deferred_mode = False
+# messages waiting for `flush`, each entry is [topic, data]
+pending = deque()
+# pending entries of `latest_only` topics so they can be replaced
+pending_latest = {}
+flushing = False
+
+
+def set_deferred_mode(enabled: bool = True):
+    """Enable or disable deferred delivery.
+
+    Messages that are already queued are delivered when deferred mode
+    is disabled.
+    """
+    global deferred_mode
+    deferred_mode = enabled
+    if not enabled:
+        flush()
 
-def is_internal_frame(frame):
-    """Checks if a frame is part of bus.py"""
-    m_name = frame.f_globals['__name__']
-    return m_name == __name__
+
+def flush():
+    """Deliver queued messages in the order they were published.
+
+    Messages published by subscribers while flushing are delivered
+    in the same flush.
+    """
+    global flushing
+    if flushing:
+        return
+
+    flushing = True
+    try:
+        while pending:
+            entry = pending.popleft()
+            topic, data = entry
+            if pending_latest.get(topic) is entry:
+                del pending_latest[topic]
+            topic.deliver(data)
+    finally:
+        flushing = False
 
 
 def generate_name():
-    """This generates a module name using stack frames."""
-    f = currentframe()
-    stacklevel = 1
-    while stacklevel > 0:
-        f_next = f.f_back
-        if f_next is None:
-            break
-        f = f_next
-        if not is_internal_frame(f):
-            stacklevel -= 1
+    """This generates a module name using stack frames.
+
+    The name is the module of the first caller outside of bus.py. Frames are
+    compared by their globals so no names are looked up while walking.
+    """
+    internal = globals()
+    f = sys._getframe(1)
+    while f.f_globals is internal and f.f_back is not None:
+        f = f.f_back
+    return f.f_globals['__name__']
+
+
+# subscriber execution policies
+INLINE = 'inline'
+THREAD_POOL = 'thread_pool'
+WORKER = 'worker'
+
+# number of threads used by THREAD_POOL subscribers
+POOL_WORKERS = 4
+pool = None
+
+
+def get_pool() -> ThreadPoolExecutor:
+    """Returns the thread pool shared by THREAD_POOL subscribers."""
+    global pool
+    if pool is None:
+        pool = ThreadPoolExecutor(max_workers=POOL_WORKERS,
+                                  thread_name_prefix='bus')
+    return pool
+
+
+class PoolCallback:
+    """Runs a subscriber callback in the shared thread pool."""
+
+    def __init__(self, callback: Callable[[T], None], name: str):
+        self.callback = callback
+        self.name = name
+        self.lock = threading.Lock()
+        self.queue_depth = 0
+
+    def __call__(self, data: T, call_stats: 'CallStats | None' = None):
+        with self.lock:
+            self.queue_depth += 1
+        get_pool().submit(self.run, data, call_stats)
+
+    def run(self, data: T, call_stats: 'CallStats | None'):
+        start = time.perf_counter()
+        try:
+            self.callback(data)
+        except Exception:
+            logger.exception(f'subscriber {self.name} failed')
+        finally:
+            if call_stats is not None:
+                call_stats.add(time.perf_counter() - start)
+            with self.lock:
+                self.queue_depth -= 1
+
+    def describe(self):
+        return f'{THREAD_POOL} queue={self.queue_depth}'
+
+
+class WorkerCallback:
+    """Runs a subscriber callback in a dedicated thread.
+
+    Messages wait in a queue holding at most `max_queue` messages.
+    When the queue is full the oldest message is dropped.
+    """
+
+    def __init__(self, callback: Callable[[T], None], name: str, max_queue: int = 1):
+        if max_queue < 1:
+            raise ValueError(f'{name} worker queue must hold a message')
+        self.callback = callback
+        self.name = name
+        self.queue = deque(maxlen=max_queue)
+        self.dropped = 0
+        self.running = True
+        self.ready = threading.Condition()
+        self.thread = threading.Thread(
+            target=self.run, name=f'bus:{name}', daemon=True)
+        self.thread.start()
+
+    @property
+    def queue_depth(self):
+        return len(self.queue)
+
+    def __call__(self, data: T, call_stats: 'CallStats | None' = None):
+        with self.ready:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append((data, call_stats))
+            self.ready.notify()
+
+    def run(self):
+        while True:
+            with self.ready:
+                while self.running and not self.queue:
+                    self.ready.wait()
+                if not self.running:
+                    return
+                data, call_stats = self.queue.popleft()
+            start = time.perf_counter()
+            try:
+                self.callback(data)
+            except Exception:
+                logger.exception(f'subscriber {self.name} failed')
+            if call_stats is not None:
+                call_stats.add(time.perf_counter() - start)
+
+    def stop(self):
+        """Stop the worker thread, queued messages are discarded."""
+        with self.ready:
+            self.running = False
+            self.ready.notify()
+
+    def describe(self):
+        return f'{WORKER} queue={self.queue_depth} dropped={self.dropped}'
+
+
+class PatternCallback:
+    """Sends one topic's messages to the THREAD_POOL or WORKER callback of a
+    `PatternSubscriber`, which all of its topics share."""
+
+    def __init__(self, callback: PoolCallback | WorkerCallback, topic_name: str):
+        self.callback = callback
+        self.topic_name = topic_name
+
+    def __call__(self, data: T, call_stats: 'CallStats | None' = None):
+        self.callback((self.topic_name, data), call_stats)
 
-    fn = f.f_globals['__name__']
-    return fn
+    def describe(self):
+        return self.callback.describe()
+
+
+def wrap_callback(callback: Callable[[T], None], name: str, policy: str, max_queue: int):
+    """Wraps `callback` so it runs according to the execution `policy`."""
+    if policy == INLINE:
+        return callback
+    if policy == THREAD_POOL:
+        return PoolCallback(callback, name)
+    if policy == WORKER:
+        return WorkerCallback(callback, name, max_queue)
+    raise ValueError(f'unknown subscriber policy {policy}')
+
+
+# when True, `Topic.deliver` records how long each subscriber takes
+stats_enabled = False
+# seconds between writing stats to the log, None to disable
+stats_dump_period = None
+last_stats_dump = 0.0
+# number of recent call durations kept for percentiles
+STATS_SAMPLES = 1000
+
+
+def set_stats_enabled(enabled: bool = True, dump_period: float | None = 10.0):
+    """Enable or disable recording of subscriber timing.
+
+    While enabled, stats are written to the debug log every `dump_period`
+    seconds. Enabling stats resets previously recorded stats.
+    """
+    global stats_enabled, stats_dump_period, last_stats_dump
+    if enabled and not stats_enabled:
+        for topic in topics.values():
+            topic.reset_stats()
+        last_stats_dump = time.perf_counter()
+    stats_enabled = enabled
+    stats_dump_period = dump_period
+    if enabled:
+        # dumps are debug level so they only go to the debug log file
+        stats_logger.setLevel(logging.DEBUG)
+
+
+class CallStats:
+    """Timing of calls to one subscriber.
+
+    THREAD_POOL and WORKER subscribers add to it from their own threads.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=STATS_SAMPLES)
+        self.lock = threading.Lock()
+
+    def add(self, duration: float):
+        with self.lock:
+            self.calls += 1
+            self.total += duration
+            self.samples.append(duration)
+
+    def summary(self) -> dict:
+        """Returns call count, and total/mean/p99 time in seconds."""
+        with self.lock:
+            calls, total = self.calls, self.total
+            samples = sorted(self.samples)
+        if calls == 0:
+            return {'calls': 0, 'total': 0.0, 'mean': 0.0, 'p99': 0.0}
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+        return {
+            'calls': calls,
+            'total': total,
+            'mean': total / calls,
+            'p99': p99,
+        }
 
 
 class Topic(Generic[T]):
@@ -61,44 +399,217 @@ class Topic(Generic[T]):
     track of what publishers/subscribers exist and basic type checking.
     """
 
-    def __init__(self, topic_name: str, topic_type: type):
+    def __init__(self, topic_name: str, topic_type: type, queue_size: int = QUEUE_SIZE,
+                 latest_only: bool = False, schema: Schema | None = None):
         self.topic_name = topic_name
         self.topic_type = topic_type
+        self.latest_only = latest_only
+        self.schema = schema
         self.observers = dict()
-        self.publishers = []
-        self.queue = []
+        # flattened copy of `observers` used by `broadcast`
+        self.callbacks = ()
+        self.publishers = set()
+        self.queue = deque(maxlen=queue_size)
+        self.reset_stats()
 
     def __repr__(self):
         return f'Topic({self.topic_name}, {self.topic_type})'
 
+    def reset_stats(self):
+        """Clear recorded message counts and subscriber timing."""
+        self.message_count = 0
+        self.stats_start = time.perf_counter()
+        self.call_stats = {name: CallStats() for name in self.observers}
+
+    def set_queue_size(self, queue_size: int):
+        """Set how many messages are kept to replay to new subscribers.
+
+        The most recent messages are kept if the queue shrinks.
+        """
+        if queue_size < 0:
+            raise ValueError(f'{self} queue size cannot be negative')
+        self.queue = deque(self.queue, maxlen=queue_size)
+
     def register_observer(self, callback: Callable[[T], None], name: str):
         """Register a `callback` function used to send data to a subscriber"""
         if name in self.observers:
             raise IndexError(f'{name} is already registered to {self}')
 
         self.observers[name] = callback
+        self.callbacks = tuple(self.observers.values())
+        self.call_stats[name] = CallStats()
 
-        for data in self.queue:
+        for data in tuple(self.queue):
             callback(data)
 
+    def unregister_observer(self, name: str):
+        """Remove the subscriber called `name`"""
+        if name not in self.observers:
+            raise IndexError(f'{name} is not registered to {self}')
+
+        callback = self.observers.pop(name)
+        self.callbacks = tuple(self.observers.values())
+        self.call_stats.pop(name, None)
+        if hasattr(callback, 'stop'):
+            callback.stop()
+
     def register_publisher(self, name: str):
         """Register the name of a publisher"""
         if name in self.publishers:
             raise IndexError(f'{name} is already a publisher for {self}')
-        self.publishers.append(name)
+        self.publishers.add(name)
 
-    def broadcast(self, data: T):
-        """Sends data to subscribers."""
-        if not isinstance(data, self.topic_type):
-            raise TypeError(
-                f'{self} passed an invalid type {data}({type(data)})')
+    def unregister_publisher(self, name: str):
+        """Remove the name of a publisher"""
+        if name not in self.publishers:
+            raise IndexError(f'{name} is not a publisher for {self}')
+        self.publishers.remove(name)
 
+    def broadcast(self, data: T):
+        """Sends data to subscribers, or queues it in deferred mode."""
+        if not release_mode:
+            if not isinstance(data, self.topic_type):
+                raise TypeError(
+                    f'{self} passed an invalid type {data}({type(data)})')
+            if self.schema is not None and not self.schema.matches(data):
+                raise TypeError(
+                    f'{self} expected {self.schema} but got '
+                    f'{getattr(data, "dtype", None)} {getattr(data, "shape", None)}')
+
+        if deferred_mode:
+            if self.latest_only and self in pending_latest:
+                pending_latest[self][1] = data
+                return
+
+            entry = [self, data]
+            pending.append(entry)
+            if self.latest_only:
+                pending_latest[self] = entry
+            return
+
+        self.deliver(data)
+
+    def deliver(self, data: T):
+        """Sends data to subscribers without type checking."""
         self.queue.append(data)
-        while len(self.queue) > 10:
-            self.queue.pop(0)
 
-        for name in self.observers:
-            self.observers[name](data)
+        if stats_enabled:
+            self.deliver_timed(data)
+            return
+
+        for callback in self.callbacks:
+            callback(data)
+
+    def deliver_timed(self, data: T):
+        """Sends data to subscribers while recording how long they take."""
+        self.message_count += 1
+        for name, callback in tuple(self.observers.items()):
+            call_stats = self.call_stats.get(name)
+            if isinstance(callback, (PoolCallback, WorkerCallback, PatternCallback)):
+                # timed on the thread running it, calling it only enqueues
+                callback(data, call_stats)
+                continue
+            start = time.perf_counter()
+            callback(data)
+            if call_stats is not None:
+                call_stats.add(time.perf_counter() - start)
+
+        if stats_dump_period is not None:
+            if time.perf_counter() - last_stats_dump > stats_dump_period:
+                dump_stats()
+
+
+topics = {}
+
+
+def is_pattern(topic_name: str) -> bool:
+    """Checks if a topic name contains wildcards."""
+    return '*' in topic_name
+
+
+class PatternIndex:
+    """Trie of pattern subscribers indexed by topic levels.
+
+    Each node holds the subscribers whose pattern ends there, and children
+    for each level. `*` and `**` are stored as children like any other level.
+    """
+
+    def __init__(self):
+        self.children = {}
+        self.subscribers = []
+
+    def add(self, levels: list, subscriber):
+        node = self
+        for level in levels:
+            node = node.children.setdefault(level, PatternIndex())
+        node.subscribers.append(subscriber)
+
+    def remove(self, levels: list, subscriber):
+        node = self
+        for level in levels:
+            node = node.children[level]
+        node.subscribers.remove(subscriber)
+
+    def match(self, levels: list) -> list:
+        """Returns subscribers with a pattern matching the topic `levels`."""
+        found = {}
+        self.collect(levels, 0, found)
+        return list(found.values())
+
+    def collect(self, levels: list, i: int, found: dict):
+        if '**' in self.children:
+            node = self.children['**']
+            for j in range(i, len(levels) + 1):
+                node.collect(levels, j, found)
+
+        if i == len(levels):
+            for subscriber in self.subscribers:
+                found[id(subscriber)] = subscriber
+            return
+
+        if levels[i] in self.children:
+            self.children[levels[i]].collect(levels, i + 1, found)
+        if '*' in self.children:
+            self.children['*'].collect(levels, i + 1, found)
+
+
+pattern_index = PatternIndex()
+
+
+def get_topic(topic_name: str, topic_type: type, role: str,
+              queue_size: int | None = None, latest_only: bool | None = None,
+              schema: Schema | None = None) -> Topic:
+    """Returns the topic named `topic_name`, creating it if needed.
+
+    `queue_size` and `latest_only` update the topic settings if provided.
+    A `schema` is set on the topic, or must match the one it already has.
+    `role` is only used to describe the caller in error messages.
+    """
+    if is_pattern(topic_name):
+        raise ValueError(
+            f'{topic_name} is a pattern, use PatternSubscriber instead')
+
+    if topic_name not in topics:
+        topic = topics[topic_name] = Topic(topic_name, topic_type)
+        for subscriber in pattern_index.match(topic_name.split('/')):
+            subscriber.attach(topic)
+
+    topic = topics[topic_name]
+    if topic.topic_type != topic_type:
+        raise TypeError(
+            f'Tried to create {role} ({topic_type}) for ({topic})')
+
+    if queue_size is not None:
+        topic.set_queue_size(queue_size)
+    if latest_only is not None:
+        topic.latest_only = latest_only
+    if schema is not None:
+        if topic.schema is not None and topic.schema != schema:
+            raise TypeError(
+                f'Tried to create {role} ({schema}) for ({topic}) with {topic.schema}')
+        topic.schema = schema
+
+    return topic
 
 
 class Publisher(Generic[T]):
@@ -107,28 +618,30 @@ class Publisher(Generic[T]):
 
     If a name is not provided, it defaults to the name of the module.
 
+    If `queue_size` is provided, it sets how many messages the topic keeps
+    to replay to new subscribers. If `latest_only` is provided, it sets if
+    only the last message published each tick is delivered in deferred mode.
+    If `schema` is provided, published arrays must match it.
+
     Example:
     ```
     publisher = bus.Publisher('topic_name', str)
     publisher.publish('hello there')
+
+    # latched topic, new subscribers only receive the latest value
+    pose_publisher = bus.Publisher('/bot/pose', np.ndarray, queue_size=1)
     ```
     """
 
-    def __init__(self, topic_name: str, topic_type: type, name: str | None = None):
+    def __init__(self, topic_name: str, topic_type: type, name: str | None = None,
+                 queue_size: int | None = None, latest_only: bool | None = None,
+                 schema: Schema | None = None):
         if name is None:
             name = generate_name()
         self.name = name
 
-        global topics
-        if topic_name not in topics:
-            topics[topic_name] = Topic(topic_name, topic_type)
-
-        topic = topics[topic_name]
-
-        if topic.topic_type != topic_type:
-            raise TypeError(
-                f'Tried to create publisher ({topic_type}) for ({topic})')
-
+        topic = get_topic(topic_name, topic_type, 'publisher',
+                          queue_size, latest_only, schema)
         topic.register_publisher(name)
         self.topic = topic
 
@@ -136,8 +649,17 @@ class Publisher(Generic[T]):
         """Send `data` to the topic to be broadcast to subscribers."""
         self.topic.broadcast(data)
 
+    def has_subscribers(self) -> bool:
+        """Checks if anything is subscribed to the topic.
 
-topics = {}
+        Publishers can use this to skip work nobody will receive. Skipped
+        data is also not replayed to subscribers that register later.
+        """
+        return len(self.topic.callbacks) > 0
+
+    def unregister(self):
+        """Remove this publisher from the topic."""
+        self.topic.unregister_publisher(self.name)
 
 
 class Subscriber(Generic[T]):
@@ -146,6 +668,16 @@ class Subscriber(Generic[T]):
 
     If a name is not provided, it defaults to the name of the module.
 
+    If `queue_size` is provided, it sets how many messages the topic keeps
+    to replay to new subscribers. This is applied before `callback` receives
+    the replayed messages. If `latest_only` is provided, it sets if only the
+    last message published each tick is delivered in deferred mode.
+    If `schema` is provided, the subscriber only accepts arrays matching it.
+
+    `policy` sets where the callback runs (INLINE, THREAD_POOL or WORKER).
+    `max_queue` is the number of messages a WORKER subscriber can hold
+    before it starts dropping the oldest ones.
+
     Example:
     ```
     def say_hi(name):
@@ -155,19 +687,94 @@ class Subscriber(Generic[T]):
     ```
     """
 
-    def __init__(self, topic_name, topic_type: type, callback: Callable[[T], None], name: str | None = None):
+    def __init__(self, topic_name, topic_type: type, callback: Callable[[T], None], name: str | None = None,
+                 queue_size: int | None = None, latest_only: bool | None = None,
+                 schema: Schema | None = None, policy: str = INLINE, max_queue: int = 1):
         if name is None:
             name = generate_name()
 
-        global topics
-        if topic_name not in topics:
-            topics[topic_name] = Topic(topic_name, topic_type)
-
-        topic = topics[topic_name]
-        if topic.topic_type != topic_type:
-            raise TypeError(
-                f'Tried to create subscriber ({topic_type}) for ({topic})')
+        topic = get_topic(topic_name, topic_type, 'subscriber',
+                          queue_size, latest_only, schema)
+        callback = wrap_callback(callback, name, policy, max_queue)
         topic.register_observer(callback, name)
+        self.name = name
+        self.topic = topic
+
+    def unsubscribe(self):
+        """Stop receiving data from the topic."""
+        self.topic.unregister_observer(self.name)
+
+
+class PatternSubscriber:
+    """
+    This class is used to add a callback function to every topic matching
+    a pattern, such as `/bot/sensor/*` or `/bot/**`.
+
+    Unlike `Subscriber`, the callback receives the topic name as well as
+    the data. Only topics of `topic_type` are matched, use `object` to match
+    topics of any type.
+
+    If a name is not provided, it defaults to the name of the module.
+    `policy` and `max_queue` are the same as `Subscriber`, all matching
+    topics share one WORKER thread.
+
+    Example:
+    ```
+    def log(topic_name, data):
+        print(topic_name, data)
+
+    bus.PatternSubscriber('/bot/sensor/*', object, log)
+    ```
+    """
+
+    def __init__(self, pattern: str, topic_type: type, callback: Callable[[str, T], None],
+                 name: str | None = None, policy: str = INLINE, max_queue: int = 1):
+        if name is None:
+            name = generate_name()
+
+        self.pattern = pattern
+        self.levels = pattern.split('/')
+        self.topic_type = topic_type
+        self.name = name
+        # name used for each topic so it doesn't clash with a normal subscriber
+        self.observer_name = f'{name}[{pattern}]'
+        self.callback = wrap_callback(
+            lambda item: callback(*item), self.observer_name, policy, max_queue)
+        self.topics = []
+
+        pattern_index.add(self.levels, self)
+        match = PatternIndex()
+        match.add(self.levels, self)
+        for topic in list(topics.values()):
+            if match.match(topic.topic_name.split('/')):
+                self.attach(topic)
+
+    def attach(self, topic: Topic):
+        """Start receiving data from `topic`."""
+        if self.topic_type is not object and topic.topic_type != self.topic_type:
+            return
+
+        topic_name = topic.topic_name
+        callback = self.callback
+        if isinstance(callback, (PoolCallback, WorkerCallback)):
+            topic.register_observer(
+                PatternCallback(callback, topic_name), self.observer_name)
+        else:
+            topic.register_observer(
+                lambda data: callback((topic_name, data)), self.observer_name)
+        self.topics.append(topic)
+
+    def unsubscribe(self):
+        """Stop receiving data from all matching topics."""
+        pattern_index.remove(self.levels, self)
+        for topic in self.topics:
+            topic.unregister_observer(self.observer_name)
+        self.topics = []
+        if hasattr(self.callback, 'stop'):
+            self.callback.stop()
+
+
+pattern_subscribers = {}
 
 
 def describe_topic(topic_name: str):
@@ -180,13 +787,16 @@ def describe_topic(topic_name: str):
     print('=' * 3, f'TOPIC: {topic_name}', '=' * 3)
 
     print('PUBLISHERS:')
-    for name in topic.publishers:
+    for name in sorted(topic.publishers):
         print(f'- {name}')
 
     print('\n')
     print('SUBSCRIBERS:')
-    for name in topic.observers:
-        print(f'- {name}')
+    for name, callback in topic.observers.items():
+        if hasattr(callback, 'describe'):
+            print(f'- {name} [{callback.describe()}]')
+        else:
+            print(f'- {name}')
 
 
 def describe_node(node_name: str):
@@ -211,34 +821,136 @@ def describe_node(node_name: str):
             print(f'- {topic_name}')
 
 
+def stats() -> dict:
+    """Returns recorded timing for every topic.
+
+    The result maps topic names to a dict with:
+    - messages: number of messages delivered
+    - rate: messages per second
+    - subscribers: dict of subscriber name to calls, total, mean and p99,
+    times are in seconds.
+
+    Stats are only recorded after `set_stats_enabled` is called.
+    """
+    now = time.perf_counter()
+    result = {}
+    for topic_name, topic in topics.items():
+        elapsed = now - topic.stats_start
+        result[topic_name] = {
+            'messages': topic.message_count,
+            'rate': topic.message_count / elapsed if elapsed > 0 else 0.0,
+            'subscribers': {name: call_stats.summary()
+                            for name, call_stats in topic.call_stats.items()},
+        }
+    return result
+
+
+def dump_stats():
+    """Writes stats to the debug log, slowest subscribers first."""
+    global last_stats_dump
+    last_stats_dump = time.perf_counter()
+
+    rows = []
+    for topic_name, topic_stats in stats().items():
+        for name, summary in topic_stats['subscribers'].items():
+            rows.append((topic_name, topic_stats['rate'], name, summary))
+    rows.sort(key=lambda row: row[3]['total'], reverse=True)
+
+    lines = ['=== BUS STATS ===']
+    for topic_name, rate, name, summary in rows:
+        if summary['calls'] == 0:
+            continue
+        lines.append(
+            f'{topic_name} ({rate:.1f} msg/s) -> {name}: '
+            f'calls={summary["calls"]} total={summary["total"] * 1000:.1f}ms '
+            f'mean={summary["mean"] * 1000:.3f}ms p99={summary["p99"] * 1000:.3f}ms')
+    stats_logger.debug('\n'.join(lines))
+
+
 def get_topics():
     """Returns a list of used topic names."""
     return [topic for topic in topics]
 
 
-def inspect(topic_name: str, topic_type: type):
-    """Creates a subscriber that simply prints anything sent to a topic."""
+def inspect(topic_name: str, topic_type: type = object):
+    """Creates a subscriber that simply prints anything sent to a topic.
+
+    `topic_name` can be a pattern, in which case the topic name is printed
+    with the data.
+
+    Returns the subscriber so it can be removed with `unsubscribe`.
+    """
     if not hasattr(inspect, 'count'):
         inspect.count = 0
 
     inspect.count += 1
+    name = f'inspector@{inspect.count}'
+
+    if is_pattern(topic_name):
+        def log_topic(topic_name, data):
+            print(f'{topic_name}: {data}')
+
+        return PatternSubscriber(topic_name, topic_type, log_topic, name)
 
     def log(data):
         print(data)
 
-    Subscriber(topic_name, topic_type, log, f'inspector@{inspect.count}')
+    return Subscriber(topic_name, topic_type, log, name)
 
 
-def publish_once(topic_name: str, topic_type: type, data: T):
+def publish_once(topic_name: str, topic_type: type, data: T, queue_size: int | None = None,
+                 schema: Schema | None = None):
     """Creates a one off publisher that sends data once.
 
     This could be used to initialize data.
     """
-    pub = Publisher(topic_name, topic_type)
-    pub.publish(data)
+    pub = Publisher(topic_name, topic_type,
+                    queue_size=queue_size, schema=schema)
+    try:
+        pub.publish(data)
+    finally:
+        pub.unregister()
+
+
+def record(path: str, topics: list):
+    """Start recording messages on `topics` to the file at `path`.
+
+    Returns a `bus_bag.Recorder`, call `close` on it to finish the file.
+    """
+    import bus_bag
+    return bus_bag.record(path, topics)
+
+
+def replay(path: str, speed: float | None = 1.0, topics: list | None = None):
+    """Publish messages recorded with `record` back onto the bus.
+
+    `speed` is a multiple of the recorded speed, `None` replays as fast
+    as possible.
+    """
+    import bus_bag
+    bus_bag.replay(path, speed, topics)
+
 
+def unsubscribe(topic_name: str, name: str):
+    """Remove the subscriber called `name` from a topic.
 
-def subscribe(topic_name: str, topic_type: type, name: str | None = None):
+    This can be used to remove subscribers created with `subscribe`,
+    `topic_name` is the pattern for pattern subscribers.
+    """
+    if is_pattern(topic_name):
+        if (topic_name, name) not in pattern_subscribers:
+            raise IndexError(f'{name} is not subscribed to {topic_name}')
+        pattern_subscribers.pop((topic_name, name)).unsubscribe()
+        return
+
+    if topic_name not in topics:
+        raise IndexError(f'{topic_name} is not a used topic')
+    topics[topic_name].unregister_observer(name)
+
+
+def subscribe(topic_name: str, topic_type: type, name: str | None = None,
+              queue_size: int | None = None, latest_only: bool | None = None,
+              schema: Schema | None = None, policy: str = INLINE, max_queue: int = 1):
     """
     This decorator function can be used to register a function as
     a subscriber.
@@ -246,15 +958,38 @@ def subscribe(topic_name: str, topic_type: type, name: str | None = None):
     This exists to make registering a subscriber less ugly.
 
     If a name is not provided, it defaults to the name of the module.
+    The other options are the same as `Subscriber`.
+
+    If `topic_name` is a pattern a `PatternSubscriber` is created, so the
+    callback receives the topic name and the data.
 
     Example:
     ```
     @bus.subscribe('topic_name', str)
     def say_hi(name):
         print(name)
+
+    # run a slow subscriber in its own thread
+    @bus.subscribe('/bot/sensor/lidar', np.ndarray, policy=bus.WORKER)
+    def slow(readings):
+        ...
+
+    # every sensor topic
+    @bus.subscribe('/bot/sensor/*', object)
+    def sensor(topic_name, data):
+        ...
     ```
     """
     def wrapper(callback: Callable[[T], None]):
-        Subscriber(topic_name, topic_type, callback, name=name)
+        if is_pattern(topic_name):
+            sub_name = name if name is not None else generate_name()
+            pattern_subscribers[(topic_name, sub_name)] = PatternSubscriber(
+                topic_name, topic_type, callback, name=sub_name,
+                policy=policy, max_queue=max_queue)
+            return callback
+
+        Subscriber(topic_name, topic_type, callback,
+                   name=name, queue_size=queue_size, latest_only=latest_only,
+                   schema=schema, policy=policy, max_queue=max_queue)
         return callback
     return wrapper
@@ -0,0 +1,271 @@
+"""Bus recording
+
+This module records bus traffic to a file so it can be replayed later
+without webots. This makes it possible to rerun systems like mapping, path
+planning and object detection offline against a recorded run.
+
+This module provides:
+- Recorder / record: subscribe to topics and write every message to a file.
+- read: iterate over the messages in a recording.
+- replay: publish the messages in a recording back onto the bus.
+
+Every message is stored with the simulation time in ms, counted from
+`/bot/cmd_tick` messages since recording started.
+
+File format:
+The file starts with `MAGIC`, followed by chunks. Each chunk has a
+`CHUNK` header and holds a number of records. Each record has a `RECORD`
+header, metadata then payload, both padded to 8 bytes so arrays stay aligned.
+- TOPIC records define a topic id, the payload is the pickled name and type.
+- ARRAY records hold a numpy array, the metadata is the shape and dtype and
+the payload is the raw array data.
+- PICKLE records hold any other pickled data.
+
+Files are read through `mmap` one record at a time, so recordings larger
+than memory can be replayed.
+
+Example:
+```
+recorder = bus.record('run.bag', ['/bot/pose', '/bot/sensor/lidar'])
+...
+recorder.close()
+
+# offline, 20 times faster than the recording
+import service.mapping
+bus.replay('run.bag', speed=20)
+```
+"""
+import ast
+import mmap
+import pickle
+import struct
+import time
+
+import numpy as np
+import bus
+
+MAGIC = b'BUSBAG1\0'
+# magic, record count, chunk size in bytes
+CHUNK = struct.Struct('<4sIQ')
+CHUNK_MAGIC = b'CHNK'
+# kind, ndim, topic id, metadata size, time in ms, payload size
+RECORD = struct.Struct('<BBHIqQ')
+
+KIND_TOPIC = 0
+KIND_ARRAY = 1
+KIND_PICKLE = 2
+
+# chunks are written once they hold this many bytes
+CHUNK_SIZE = 1024 * 1024
+
+
+def pad(nbytes: int) -> int:
+    """Returns the number of bytes needed to align `nbytes` to 8 bytes."""
+    return -nbytes % 8
+
+
+def encode_dtype(dtype: np.dtype) -> bytes:
+    return repr(np.lib.format.dtype_to_descr(dtype)).encode()
+
+
+def decode_dtype(raw: bytes) -> np.dtype:
+    return np.lib.format.descr_to_dtype(ast.literal_eval(raw.decode()))
+
+
+class Recorder:
+    """Records messages sent to `topics` into the file at `path`.
+
+    `topics` is a list of topic names or `(topic_name, topic_type)` tuples.
+    A type is only needed for topics that do not exist yet. Topic names can
+    be patterns like `/bot/sensor/*` to record every matching topic.
+    """
+
+    count = 0
+
+    def __init__(self, path: str, topics: list):
+        Recorder.count += 1
+        self.name = f'recorder@{Recorder.count}'
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC)
+        self.chunk = bytearray()
+        self.chunk_count = 0
+        self.time_ms = 0
+        self.topic_ids = {}
+        self.subscribers = []
+        self.closed = False
+
+        self.subscribers.append(bus.Subscriber(
+            '/bot/cmd_tick', int, self.tick, name=f'{self.name}:clock'))
+
+        for topic in topics:
+            if isinstance(topic, str) and bus.is_pattern(topic):
+                self.subscribers.append(bus.PatternSubscriber(
+                    topic, object, self.write_pattern_message, name=self.name))
+                continue
+
+            if isinstance(topic, str):
+                if topic not in bus.topics:
+                    raise KeyError(f'{topic} is not a used topic, give a type')
+                topic_name, topic_type = topic, bus.topics[topic].topic_type
+            else:
+                topic_name, topic_type = topic
+            self.add_topic(topic_name, topic_type)
+
+    def tick(self, timestep: int):
+        self.time_ms += timestep
+
+    def define_topic(self, topic_name: str, topic_type: type) -> int:
+        """Write a TOPIC record and return the new topic id."""
+        topic_id = len(self.topic_ids)
+        self.topic_ids[topic_name] = topic_id
+        self.write_record(KIND_TOPIC, 0, topic_id, b'',
+                          pickle.dumps((topic_name, topic_type)))
+        return topic_id
+
+    def add_topic(self, topic_name: str, topic_type: type):
+        topic_id = self.define_topic(topic_name, topic_type)
+
+        def callback(data):
+            self.write_message(topic_id, data)
+
+        self.subscribers.append(bus.Subscriber(
+            topic_name, topic_type, callback, name=self.name))
+
+    def write_pattern_message(self, topic_name: str, data):
+        if self.closed:
+            return
+        if topic_name not in self.topic_ids:
+            self.define_topic(topic_name, bus.topics[topic_name].topic_type)
+        self.write_message(self.topic_ids[topic_name], data)
+
+    def write_message(self, topic_id: int, data):
+        if self.closed:
+            return
+
+        if isinstance(data, np.ndarray) and not data.dtype.hasobject:
+            if not data.flags.c_contiguous:
+                data = data.copy()
+            meta = struct.pack(f'<{data.ndim}Q', *data.shape) + \
+                encode_dtype(data.dtype)
+            self.write_record(KIND_ARRAY, data.ndim, topic_id,
+                              meta, memoryview(data.reshape(-1).view(np.uint8)))
+        else:
+            self.write_record(KIND_PICKLE, 0, topic_id, b'',
+                              pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def write_record(self, kind: int, ndim: int, topic_id: int, meta: bytes, payload):
+        chunk = self.chunk
+        chunk += RECORD.pack(kind, ndim, topic_id, len(meta),
+                             self.time_ms, len(payload))
+        chunk += meta
+        chunk += bytes(pad(len(meta)))
+        chunk += payload
+        chunk += bytes(pad(len(payload)))
+        self.chunk_count += 1
+
+        if len(chunk) >= CHUNK_SIZE:
+            self.write_chunk()
+
+    def write_chunk(self):
+        if self.chunk_count == 0:
+            return
+        self.file.write(CHUNK.pack(CHUNK_MAGIC, self.chunk_count,
+                                   len(self.chunk)))
+        self.file.write(self.chunk)
+        self.chunk = bytearray()
+        self.chunk_count = 0
+
+    def close(self):
+        """Stop recording, then write buffered messages and close the file."""
+        if self.closed:
+            return
+        for subscriber in self.subscribers:
+            subscriber.unsubscribe()
+        self.write_chunk()
+        self.file.close()
+        self.closed = True
+
+
+def record(path: str, topics: list) -> Recorder:
+    """Start recording `topics` to `path`. Call `close` to finish."""
+    return Recorder(path, topics)
+
+
+def read(path: str, topics: list | None = None):
+    """Iterate over messages in a recording.
+
+    Yields `(time_ms, topic_name, topic_type, data)`, only for `topics`
+    if it is provided. Arrays are copied out of the file.
+    """
+    with open(path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:len(MAGIC)] != MAGIC:
+                raise ValueError(f'{path} is not a bus recording')
+
+            topic_info = {}
+            offset = len(MAGIC)
+            while offset < len(mm):
+                magic, count, nbytes = CHUNK.unpack_from(mm, offset)
+                if magic != CHUNK_MAGIC:
+                    raise ValueError(f'{path} is corrupted at byte {offset}')
+                offset += CHUNK.size
+
+                for _ in range(count):
+                    kind, ndim, topic_id, meta_size, time_ms, size = \
+                        RECORD.unpack_from(mm, offset)
+                    meta_start = offset + RECORD.size
+                    start = meta_start + meta_size + pad(meta_size)
+                    offset = start + size + pad(size)
+
+                    if kind == KIND_TOPIC:
+                        topic_info[topic_id] = pickle.loads(
+                            mm[start:start + size])
+                        continue
+
+                    topic_name, topic_type = topic_info[topic_id]
+                    if topics is not None and topic_name not in topics:
+                        continue
+
+                    if kind == KIND_ARRAY:
+                        shape = struct.unpack_from(
+                            f'<{ndim}Q', mm, meta_start)
+                        dtype = decode_dtype(
+                            mm[meta_start + ndim * 8:meta_start + meta_size])
+                        data = np.frombuffer(mm, dtype, count=int(np.prod(shape)),
+                                             offset=start).reshape(shape).copy()
+                    else:
+                        data = pickle.loads(mm[start:start + size])
+
+                    yield time_ms, topic_name, topic_type, data
+
+
+def replay(path: str, speed: float | None = 1.0, topics: list | None = None):
+    """Publish the messages in a recording onto the bus.
+
+    `speed` is a multiple of the recorded speed, `None` replays as fast
+    as possible. Only `topics` are replayed if it is provided.
+    """
+    replay.count = getattr(replay, 'count', 0) + 1
+    name = f'replay@{replay.count}'
+    publishers = {}
+    start_ms = None
+    start = time.perf_counter()
+
+    try:
+        for time_ms, topic_name, topic_type, data in read(path, topics):
+            if topic_name not in publishers:
+                publishers[topic_name] = bus.Publisher(
+                    topic_name, topic_type, name=name)
+
+            if speed is not None:
+                if start_ms is None:
+                    start_ms = time_ms
+                delay = (time_ms - start_ms) / 1000 / speed - \
+                    (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+
+            publishers[topic_name].publish(data)
+    finally:
+        for publisher in publishers.values():
+            publisher.unregister()
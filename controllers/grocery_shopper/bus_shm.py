@@ -0,0 +1,285 @@
+"""Shared memory bus transport
+
+This module lets bus topics cross process boundaries so systems like
+mapping, planning or vision can run in another process. Modules keep using
+`bus.Publisher` and `bus.Subscriber` as usual, the transport is set up once
+per process:
+
+- export_topic: in the producing process, forwards everything published to a
+topic into a shared memory ring buffer.
+- import_topic: in the consuming process, reads the ring buffer and publishes
+the messages to the same topic in the local bus when `poll` is called.
+
+Each ring buffer has a fixed number of slots and every message gets a
+sequence number. A reader that falls more than one ring behind skips the
+overwritten messages and counts them as dropped.
+
+If a `dtype` is given when exporting, numpy arrays of that dtype with up to
+2 dimensions are copied as raw bytes straight into the slot, e.g. `/bot/pose`
+(3 floats) or lidar scans (Nx2 floats). Anything else is pickled.
+
+Example:
+```
+# process 1
+pose = bus_shm.export_topic('/bot/pose', np.ndarray, 'bot_pose',
+                           dtype=np.float64)
+
+# process 2
+pose = bus_shm.import_topic('/bot/pose', np.ndarray, 'bot_pose')
+while True:
+    pose.poll()
+```
+"""
+import ast
+import pickle
+import struct
+import threading
+import time
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+import bus
+
+# head sequence number, slot count, slot size, array dtype description
+HEADER = struct.Struct('<QII256s')
+HEAD = struct.Struct('<Q')
+# sequence number, payload size, kind, ndim, shape[0], shape[1]
+SLOT_HEADER = struct.Struct('<QQBB6xQQ')
+
+KIND_PICKLE = 0
+KIND_ARRAY = 1
+
+DEFAULT_SLOTS = 16
+DEFAULT_SLOT_SIZE = 64 * 1024
+
+
+def attach_shared_memory(shm_name: str) -> shared_memory.SharedMemory:
+    """Attach to existing shared memory without taking ownership of it.
+
+    Only the creator should unlink the memory, but before python 3.13 the
+    resource tracker unlinks anything a process attaches to on exit.
+    """
+    try:
+        return shared_memory.SharedMemory(name=shm_name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=shm_name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class ShmRing:
+    """Ring buffer of messages in shared memory.
+
+    The process that creates the ring writes to it, any number of
+    processes can attach and read from it with `ShmReader`.
+    """
+
+    def __init__(self, shm_name: str, create: bool = False, slots: int = DEFAULT_SLOTS,
+                 slot_size: int = DEFAULT_SLOT_SIZE, dtype=None):
+        self.create = create
+
+        if create:
+            size = HEADER.size + slots * (SLOT_HEADER.size + slot_size)
+            self.shm = shared_memory.SharedMemory(
+                name=shm_name, create=True, size=size)
+            dtype_str = b'' if dtype is None else repr(
+                np.lib.format.dtype_to_descr(np.dtype(dtype))).encode()
+            HEADER.pack_into(self.shm.buf, 0, 0, slots, slot_size, dtype_str)
+        else:
+            self.shm = attach_shared_memory(shm_name)
+
+        _, self.slots, self.slot_size, dtype_str = HEADER.unpack_from(
+            self.shm.buf, 0)
+        dtype_str = dtype_str.rstrip(b'\0')
+        self.dtype = np.lib.format.descr_to_dtype(
+            ast.literal_eval(dtype_str.decode())) if dtype_str else None
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return f'ShmRing({self.shm.name}, {self.slots}x{self.slot_size})'
+
+    def head(self) -> int:
+        """Sequence number of the last message written, 0 if none."""
+        return HEAD.unpack_from(self.shm.buf, 0)[0]
+
+    def slot_offset(self, seq: int) -> int:
+        slot = (seq - 1) % self.slots
+        return HEADER.size + slot * (SLOT_HEADER.size + self.slot_size)
+
+    def write(self, data):
+        """Write a message to the next slot."""
+        with self.lock:
+            seq = self.head() + 1
+            offset = self.slot_offset(seq)
+            payload = offset + SLOT_HEADER.size
+            buf = self.shm.buf
+
+            # sequence 0 marks the slot as being written
+            SLOT_HEADER.pack_into(buf, offset, 0, 0, 0, 0, 0, 0)
+
+            if (self.dtype is not None and isinstance(data, np.ndarray)
+                    and data.dtype == self.dtype and data.ndim <= 2):
+                nbytes = data.nbytes
+                self.check_size(nbytes)
+                view = np.ndarray(data.shape, self.dtype,
+                                  buffer=buf, offset=payload)
+                view[...] = data
+                shape = data.shape + (0,) * (2 - data.ndim)
+                header = (seq, nbytes, KIND_ARRAY, data.ndim) + shape
+            else:
+                raw = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+                nbytes = len(raw)
+                self.check_size(nbytes)
+                buf[payload:payload + nbytes] = raw
+                header = (seq, nbytes, KIND_PICKLE, 0, 0, 0)
+
+            SLOT_HEADER.pack_into(buf, offset, *header)
+            HEAD.pack_into(buf, 0, seq)
+
+    def check_size(self, nbytes: int):
+        if nbytes > self.slot_size:
+            raise ValueError(
+                f'{self} message of {nbytes} bytes does not fit in a slot')
+
+    def read(self, seq: int):
+        """Read message `seq`.
+
+        Returns `(True, data)`, or `(False, None)` if the slot has been
+        overwritten.
+        """
+        offset = self.slot_offset(seq)
+        payload = offset + SLOT_HEADER.size
+        buf = self.shm.buf
+
+        slot_seq, nbytes, kind, ndim, *shape = SLOT_HEADER.unpack_from(
+            buf, offset)
+        if slot_seq != seq:
+            return False, None
+
+        if kind == KIND_ARRAY:
+            view = np.ndarray(tuple(shape[:ndim]), self.dtype,
+                              buffer=buf, offset=payload)
+            data = view.copy()
+        else:
+            data = bytes(buf[payload:payload + nbytes])
+
+        # the writer may have lapped us while copying
+        if SLOT_HEADER.unpack_from(buf, offset)[0] != seq:
+            return False, None
+
+        if kind == KIND_PICKLE:
+            data = pickle.loads(data)
+        return True, data
+
+    def close(self):
+        """Detach from the shared memory, the creator also removes it."""
+        self.shm.close()
+        if self.create:
+            self.shm.unlink()
+
+
+class ShmReader:
+    """Reads new messages from a `ShmRing`."""
+
+    def __init__(self, ring: ShmRing, from_start: bool = False):
+        self.ring = ring
+        self.last_seq = 0 if from_start else ring.head()
+        self.dropped = 0
+
+    def read_new(self) -> list:
+        """Returns messages written since the last call, oldest first."""
+        head = self.ring.head()
+        if head == self.last_seq:
+            return []
+
+        start = max(self.last_seq + 1, head - self.ring.slots + 1)
+        self.dropped += start - (self.last_seq + 1)
+
+        messages = []
+        for seq in range(start, head + 1):
+            ok, data = self.ring.read(seq)
+            if ok:
+                messages.append(data)
+            else:
+                self.dropped += 1
+        self.last_seq = head
+        return messages
+
+
+class ShmExport:
+    """Writes messages from the local bus into shared memory."""
+
+    def __init__(self, topic_name: str, topic_type: type, shm_name: str,
+                 slots: int = DEFAULT_SLOTS, slot_size: int = DEFAULT_SLOT_SIZE,
+                 dtype=None):
+        self.ring = ShmRing(shm_name, create=True, slots=slots,
+                            slot_size=slot_size, dtype=dtype)
+        self.subscriber = bus.Subscriber(
+            topic_name, topic_type, self.ring.write, name=f'shm@{shm_name}')
+
+    def close(self):
+        self.subscriber.unsubscribe()
+        self.ring.close()
+
+
+def export_topic(topic_name: str, topic_type: type, shm_name: str,
+                 slots: int = DEFAULT_SLOTS, slot_size: int = DEFAULT_SLOT_SIZE,
+                 dtype=None) -> ShmExport:
+    """Forward messages published to `topic_name` into shared memory.
+
+    Creates the shared memory `shm_name` which is removed by `close`.
+    """
+    return ShmExport(topic_name, topic_type, shm_name, slots, slot_size, dtype)
+
+
+class ShmImport:
+    """Publishes messages from shared memory into the local bus."""
+
+    def __init__(self, topic_name: str, topic_type: type, shm_name: str,
+                 from_start: bool = False):
+        self.ring = ShmRing(shm_name)
+        self.reader = ShmReader(self.ring, from_start)
+        self.publisher = bus.Publisher(
+            topic_name, topic_type, name=f'shm@{shm_name}')
+        self.thread = None
+        self.running = False
+
+    @property
+    def dropped(self) -> int:
+        return self.reader.dropped
+
+    def poll(self) -> int:
+        """Publish new messages, returns how many were published."""
+        messages = self.reader.read_new()
+        for data in messages:
+            self.publisher.publish(data)
+        return len(messages)
+
+    def spin(self, period: float = 0.001):
+        """Poll from a background thread every `period` seconds."""
+        def run():
+            while self.running:
+                if self.poll() == 0:
+                    time.sleep(period)
+
+        self.running = True
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        self.publisher.unregister()
+        self.ring.close()
+
+
+def import_topic(topic_name: str, topic_type: type, shm_name: str,
+                 from_start: bool = False) -> ShmImport:
+    """Publish messages from the shared memory `shm_name` to `topic_name`.
+
+    Messages are published when `poll` is called on the returned object,
+    or continuously after calling `spin`. Only messages written after this
+    is called are received unless `from_start` is set.
+    """
+    return ShmImport(topic_name, topic_type, shm_name, from_start)
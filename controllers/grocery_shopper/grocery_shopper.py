@@ -39,6 +39,16 @@ import utils.logger_config as _
 # communicate with each other.
 import bus
 
+# Queue bus messages and deliver them at the end of each tick instead of
+# calling subscribers as soon as data is published.
+DEFERRED_BUS = False
+bus.set_deferred_mode(DEFERRED_BUS)
+
+# Record how long each subscriber takes, see `controller_debug.log`
+BUS_STATS = False
+if BUS_STATS:
+    bus.set_stats_enabled()
+
 # Sensors
 import sensors.gps as _
 import sensors.lidar as _
@@ -55,11 +65,30 @@ import service.mapping as _
 import service.identify_object as _
 #import service.odometry as _
 
+# Correct the GPS pose by matching lidar scans to the map
+SCAN_MATCHING = False
+if SCAN_MATCHING:
+    import service.localization as _
+
 # Automation
 import task_tree as _
 
+# Deliver anything published while the modules were loading
+bus.flush()
+
+# Record bus traffic to this file for offline replay, see `bus_bag`
+RECORD_PATH = None
+recorder = None
+if RECORD_PATH is not None:
+    recorder = bus.record(RECORD_PATH, [
+        '/bot/cmd_tick', '/bot/pose', '/bot/sensor/*'])
+
 # Main Loop
-tick_cmd_publisher = bus.Publisher('/bot/cmd_tick', int)
+tick_cmd_publisher = bus.Publisher('/bot/cmd_tick', int, queue_size=0)
 
 while robot.step(timestep) != -1:
     tick_cmd_publisher.publish(timestep)
+    bus.flush()
+
+if recorder is not None:
+    recorder.close()
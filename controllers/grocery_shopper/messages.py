@@ -0,0 +1,117 @@
+"""Bus message schemas
+
+This module defines the layout of numpy arrays sent over the bus so
+publishers and subscribers agree on it. Arrays are contiguous which makes
+them cheap to batch, record and share between processes.
+
+This module provides dtypes:
+    * POSE - (x, y, theta) robot pose
+    * SCAN_POINT - (x, y) lidar point in world coordinates
+    * DETECTION - (px, py, pz, r, g, b) camera recognition object, position
+    relative to the camera and color
+    * CLEARANCE - (left, front, right) distance to the closest lidar return
+
+This module provides classes:
+    * Scan - '/bot/sensor/lidar_raw', lidar ranges with the pose they were
+    taken at. World coordinates are computed when first used.
+
+This module provides schemas for topics:
+    * POSE_SCHEMA - '/bot/pose' and '/bot/sensor/gps', a 3 float array of
+    `x, y, theta`. It is kept as a plain float array so it can be unpacked,
+    `pose.view(POSE)[0]` gives the structured record.
+    * SCAN_SCHEMA - '/bot/sensor/lidar', an Nx2 float array of world
+    points. `scan.view(SCAN_POINT)[:, 0]` gives the N structured points.
+    * DETECTIONS_SCHEMA - '/bot/sensor/camera_rec' and
+    '/bot/sensor/camera_landmark', any number of `DETECTION`.
+    * CLEARANCE_SCHEMA - '/bot/safety/clearance', a 3 float array of
+    `left, front, right` clearance, `clearance.view(CLEARANCE)[0]` gives the
+    structured record.
+
+This module provides functions:
+    * detection_positions(detections) - Nx3 array of positions
+    * detection_colors(detections) - Nx3 array of colors
+"""
+
+import numpy as np
+from numpy.lib.recfunctions import structured_to_unstructured
+import bus
+from utils.scan import scan_to_world
+
+POSE = np.dtype([('x', np.float64), ('y', np.float64), ('theta', np.float64)])
+SCAN_POINT = np.dtype([('x', np.float64), ('y', np.float64)])
+DETECTION = np.dtype([
+    ('px', np.float64), ('py', np.float64), ('pz', np.float64),
+    ('r', np.float64), ('g', np.float64), ('b', np.float64),
+])
+CLEARANCE = np.dtype(
+    [('left', np.float64), ('front', np.float64), ('right', np.float64)])
+
+POSE_SCHEMA = bus.Schema(np.dtype(np.float64), (3,))
+SCAN_SCHEMA = bus.Schema(np.dtype(np.float64), (None, 2))
+DETECTIONS_SCHEMA = bus.Schema(DETECTION, (None,))
+CLEARANCE_SCHEMA = bus.Schema(np.dtype(np.float64), (3,))
+
+
+class Scan:
+    """A raw lidar scan.
+
+    `ranges` is the range of each beam and `cos_offsets`/`sin_offsets` are
+    the cos/sin of each beam angle. `world` is only computed the first time
+    it is used, so subscribers that only need ranges don't pay for it.
+
+    `ranges` may be a view of the webots lidar buffer, which is only valid
+    until the next simulation step. Copy it to keep it longer.
+
+    Pickling, like recording with `bus_bag`, only keeps `ranges`, `pose`,
+    `max_range` and the first and last beam angle. The cos/sin tables are
+    rebuilt when loaded and shared by scans with the same beams.
+    """
+    __slots__ = ('ranges', 'pose', 'cos_offsets', 'sin_offsets',
+                 'max_range', '_world')
+
+    def __init__(self, ranges: np.ndarray, pose, cos_offsets: np.ndarray,
+                 sin_offsets: np.ndarray, max_range: float):
+        self.ranges = ranges
+        self.pose = pose
+        self.cos_offsets = cos_offsets
+        self.sin_offsets = sin_offsets
+        self.max_range = max_range
+        self._world = None
+
+    def __repr__(self):
+        return f'Scan({len(self.ranges)} beams at {self.pose})'
+
+    def __reduce__(self):
+        angles = np.arctan2(self.sin_offsets[[0, -1]], self.cos_offsets[[0, -1]])
+        return _load_scan, (np.asarray(self.ranges), self.pose, self.max_range,
+                            float(angles[0]), float(angles[1]))
+
+    @property
+    def world(self) -> np.ndarray:
+        """Nx2 float array of world coordinates of beams within max_range."""
+        if self._world is None:
+            self._world = scan_to_world(self.ranges, self.cos_offsets,
+                                        self.sin_offsets, self.pose, self.max_range)
+        return self._world
+
+
+_beam_tables = {}
+
+
+def _load_scan(ranges, pose, max_range, first_angle, last_angle) -> Scan:
+    key = (len(ranges), first_angle, last_angle)
+    if key not in _beam_tables:
+        angles = np.linspace(first_angle, last_angle, len(ranges))
+        _beam_tables[key] = (np.cos(angles), np.sin(angles))
+    cos_offsets, sin_offsets = _beam_tables[key]
+    return Scan(ranges, pose, cos_offsets, sin_offsets, max_range)
+
+
+def detection_positions(detections: np.ndarray) -> np.ndarray:
+    """Returns an Nx3 float array of detection positions."""
+    return structured_to_unstructured(detections[['px', 'py', 'pz']])
+
+
+def detection_colors(detections: np.ndarray) -> np.ndarray:
+    """Returns an Nx3 float array of detection colors."""
+    return structured_to_unstructured(detections[['r', 'g', 'b']])
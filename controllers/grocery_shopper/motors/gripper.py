@@ -1,14 +1,21 @@
 """Gripper
 
 Open and close the robot gripper.
+
+The finger positions from the gripper encoders are published to
+'/bot/sensor/gripper' every tick as a 2 float array of `left, right`,
+only while something subscribes.
 """
 
 import robot
 import bus
+import numpy as np
 
 close_position = 0.0
 open_position = 0.045
 
+pub_position = bus.Publisher('/bot/sensor/gripper', np.ndarray, queue_size=1)
+
 gripper_parts = ["gripper_left_finger_joint", "gripper_right_finger_joint"]
 for part in gripper_parts:
     max_vel = robot.robot_parts[part].getMaxVelocity()
@@ -27,3 +34,10 @@ def cmd_gripper(open_state):
             close_position)
         robot.robot_parts["gripper_right_finger_joint"].setPosition(
             close_position)
+
+
+@bus.subscribe('/bot/cmd_tick', int)
+def update(_):
+    if pub_position.has_subscribers():
+        pub_position.publish(np.array([robot.left_gripper_enc.getValue(),
+                                       robot.right_gripper_enc.getValue()]))
@@ -1,23 +1,106 @@
 """Wheel motors
 
 Set the velocity of the wheels.
+
+Wheel commands are `latest_only` topics, so in deferred bus mode only the
+last velocity published in a tick is sent to webots.
+
+Forward speed is clamped using the front lidar clearance from
+'/bot/safety/clearance'. The robot slows down from `SAFETY_SLOW_DISTANCE`
+and stops at `SAFETY_STOP_DISTANCE`, turning and reversing are not limited.
+Set `SAFETY_GUARD` to False to drive the commanded velocity as is.
+
+Publishing True to '/bot/safety/override' lifts the clamp until False is
+published. Grabbing an object has to drive up to the shelf, well inside
+the stop distance, so `DriveForwards(guard=False)` sets the override while
+it runs for the close range approach in `task_tree`. The override is cleared
+when autonomous mode is turned off on '/bot/cmd_auto', since the tree then
+stops ticking and can't clear it itself.
 """
 import robot
 import bus
+import numpy as np
+
+SAFETY_GUARD = True
+SAFETY_STOP_DISTANCE = 0.3  # Meter from the lidar
+SAFETY_SLOW_DISTANCE = 0.6  # Meter from the lidar
+
+cmd_left, cmd_right = 0.0, 0.0
+speed_scale = 1.0
+safety_override = False
+# last velocity sent to webots for each wheel
+sent_left, sent_right = None, None
+
+
+def set_wheels():
+    """Send the commanded velocity to webots with the forward speed clamped.
+
+    Only wheels whose velocity changed are sent.
+    """
+    global sent_left, sent_right
+    left, right = cmd_left, cmd_right
+    forward = (left + right) / 2
+    if forward > 0 and speed_scale < 1.0 and not safety_override:
+        turn = (right - left) / 2
+        forward *= speed_scale
+        left, right = forward - turn, forward + turn
+
+    if left != sent_left:
+        robot.robot_parts["wheel_left_joint"].setVelocity(left)
+        sent_left = left
+    if right != sent_right:
+        robot.robot_parts["wheel_right_joint"].setVelocity(right)
+        sent_right = right
 
 
 def left_wheel_cmd(value):
-    robot.robot_parts["wheel_left_joint"].setVelocity(value)
+    global cmd_left
+    cmd_left = value
+    set_wheels()
 
 
-bus.Subscriber('/bot/wheel/cmd_vel/left', float, left_wheel_cmd)
+bus.Subscriber('/bot/wheel/cmd_vel/left', float,
+               left_wheel_cmd, latest_only=True)
 
 
 def right_wheel_cmd(value):
-    robot.robot_parts["wheel_right_joint"].setVelocity(value)
+    global cmd_right
+    cmd_right = value
+    set_wheels()
+
+
+bus.Subscriber('/bot/wheel/cmd_vel/right', float,
+               right_wheel_cmd, latest_only=True)
+
+
+@bus.subscribe('/bot/safety/clearance', np.ndarray, latest_only=True)
+def clearance(data):
+    global speed_scale
+    if not SAFETY_GUARD:
+        return
+
+    front = data[1]
+    scale = (front - SAFETY_STOP_DISTANCE) / \
+        (SAFETY_SLOW_DISTANCE - SAFETY_STOP_DISTANCE)
+    scale = min(max(scale, 0.0), 1.0)
+    if scale != speed_scale:
+        speed_scale = scale
+        set_wheels()
+
+
+@bus.subscribe('/bot/safety/override', bool, latest_only=True)
+def override(value):
+    global safety_override
+    if value != safety_override:
+        safety_override = value
+        set_wheels()
+
 
+@bus.subscribe('/bot/cmd_auto', bool)
+def auto_mode(autonomous):
+    if not autonomous:
+        override(False)
 
-bus.Subscriber('/bot/wheel/cmd_vel/right', float, right_wheel_cmd)
 
-bus.publish_once('/bot/wheel/cmd_vel/left', float, 0.0)
-bus.publish_once('/bot/wheel/cmd_vel/right', float, 0.0)
+bus.publish_once('/bot/wheel/cmd_vel/left', float, 0.0, queue_size=1)
+bus.publish_once('/bot/wheel/cmd_vel/right', float, 0.0, queue_size=1)
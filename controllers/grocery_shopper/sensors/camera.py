@@ -2,28 +2,71 @@
 
 This publishes camera recognition objects in two channels:
 - '/bot/sensor/camera_rec'
-This is a filtered list of recognition objects for target objects.
+This is a filtered array of recognition objects for target objects.
 - '/bot/sensor/camera_landmark'
-This is an unfiltered list recognition objects.
+This is an unfiltered array recognition objects.
+
+Recognition objects are sent as arrays of `messages.DETECTION`. The camera
+is queried once per tick and both channels are built from that snapshot.
+A channel is skipped if nobody subscribes to it.
+
+The camera and recognition sampling period can be changed at runtime by
+publishing a period in ms to '/bot/cmd_camera_period', 0 turns the camera
+off. Recognition objects are only read when a new sample is due.
 """
 from robot import robot, timestep
 import bus
+import messages
 import logging
+import math
 import numpy as np
-from typing import Sequence
+
+logger = logging.getLogger(__name__)
+
+# camera and recognition sampling period in ms
+CAMERA_PERIOD = timestep
 
 # Enable Camera
 camera = robot.getDevice('camera')
-camera.enable(timestep)
-camera.recognitionEnable(timestep)
+camera_period = 0
+since_sample = 0
 
 
-logger = logging.getLogger(__name__)
+def set_camera_period(period: int):
+    """Set the camera and recognition sampling period, 0 disables them."""
+    global camera_period, since_sample
+    if period > 0:
+        # webots can only sample on a step
+        period = math.ceil(period / timestep) * timestep
+    if period == camera_period:
+        return
+
+    logger.debug(f'Camera period {camera_period} -> {period} ms')
+    if period > 0:
+        camera.enable(period)
+        camera.recognitionEnable(period)
+    else:
+        camera.recognitionDisable()
+        camera.disable()
+    camera_period = period
+    since_sample = 0
+
+
+set_camera_period(CAMERA_PERIOD)
+
+
+@bus.subscribe('/bot/cmd_camera_period', int)
+def cmd_camera_period(period):
+    set_camera_period(period)
 
-pub_detected_objects = bus.Publisher('/bot/sensor/camera_rec', list)
-pub_landmarks = bus.Publisher('/bot/sensor/camera_landmark', list)
 
-color_ranges = []
+pub_detected_objects = bus.Publisher('/bot/sensor/camera_rec', np.ndarray, queue_size=0,
+                                     schema=messages.DETECTIONS_SCHEMA)
+pub_landmarks = bus.Publisher('/bot/sensor/camera_landmark', np.ndarray, queue_size=0,
+                              schema=messages.DETECTIONS_SCHEMA)
+
+# (R, 2, 3) array of [lower, upper] BGR bounds, one row per color range
+color_ranges = np.empty((0, 2, 3))
 
 
 def add_color_range_to_detect(lower_bound, upper_bound):
@@ -33,7 +76,19 @@ def add_color_range_to_detect(lower_bound, upper_bound):
     """
     global color_ranges
     logger.debug(f'Add [{lower_bound}, {upper_bound}] to detect')
-    color_ranges.append(np.array([lower_bound, upper_bound]))
+    color_range = np.array([lower_bound, upper_bound], dtype=np.float64)
+    color_ranges = np.concatenate((color_ranges, color_range[np.newaxis]))
+
+
+def colors_in_range(colors: np.ndarray) -> np.ndarray:
+    """
+    @param colors: Nx3 array of BGR values
+    @returns Boolean array: True for each color in any of the color ranges specified in color_ranges
+    """
+    colors = np.asarray(colors)[:, np.newaxis, :3]
+    # (N, 1, 3) against (R, 3) bounds gives (N, R, 3)
+    in_range = (colors >= color_ranges[:, 0]) & (colors <= color_ranges[:, 1])
+    return in_range.all(axis=2).any(axis=1)
 
 
 def check_if_color_in_range(bgr_tuple):
@@ -41,45 +96,26 @@ def check_if_color_in_range(bgr_tuple):
     @param bgr_tuple: Tuple of BGR values
     @returns Boolean: True if bgr_tuple is in any of the color ranges specified in color_ranges
     """
-    bgr_tuple = bgr_tuple[:3]
-    for entry in color_ranges:
-        lower, upper = entry[0], entry[1]
-        if (bgr_tuple >= lower).all() and (bgr_tuple <= upper).all():
-            return True
-    return False
+    return bool(colors_in_range(np.asarray(bgr_tuple)[np.newaxis])[0])
 
 
-class RecognitionObject:
-    """Used to store recognition objects.
+def detect_objects() -> np.ndarray:
+    """Returns an array of `messages.DETECTION` for every recognition object.
 
     This is basically a watered down version of what
     `camera.getRecognitionObjects()` returns for the sake of not needing to
     google the api.
     """
-
-    def __init__(self, position, orientation, color):
-        self.position = position
-        self.orientation = orientation
-        self.color = color[:3]
-
-    def __repr__(self):
-        return f'({self.position}), ({self.orientation}), ({self.color})'
-
-
-def detect_objects() -> Sequence[RecognitionObject]:
     objects = camera.getRecognitionObjects()
-    rec = [RecognitionObject(
-        o.getPosition(), o.getOrientation(), o.getColors()) for o in objects]
-    return rec
+    rec = [(*o.getPosition(), *o.getColors()[:3]) for o in objects]
+    return np.array(rec, dtype=messages.DETECTION)
 
 
-def filter_colors(objects: Sequence[RecognitionObject]) -> Sequence[RecognitionObject]:
-    filtered = list(
-        filter(lambda c: check_if_color_in_range(c.color), objects))
-    return filtered
+def filter_colors(objects: np.ndarray) -> np.ndarray:
+    return objects[colors_in_range(messages.detection_colors(objects))]
 
 
-def detect_filtered_objects() -> Sequence[RecognitionObject]:
+def detect_filtered_objects() -> np.ndarray:
     return filter_colors(detect_objects())
 
 
@@ -89,11 +125,22 @@ add_color_range_to_detect(lower_bound=np.array(
 
 @bus.subscribe('/bot/cmd_tick', int)
 def update_camera(_):
-    filtered_objects = detect_filtered_objects()
-    pub_detected_objects.publish(filtered_objects)
+    global since_sample
+    if camera_period == 0:
+        return
+    since_sample += timestep
+    if since_sample < camera_period:
+        return
+    since_sample = 0
+
+    if not (pub_detected_objects.has_subscribers() or pub_landmarks.has_subscribers()):
+        return
 
     objects = detect_objects()
-    pub_landmarks.publish(objects)
+    if pub_detected_objects.has_subscribers():
+        pub_detected_objects.publish(filter_colors(objects))
+    if pub_landmarks.has_subscribers():
+        pub_landmarks.publish(objects)
 
 
-#bus.inspect('/bot/sensor/camera_rec', list)
+#bus.inspect('/bot/sensor/camera_rec', np.ndarray)
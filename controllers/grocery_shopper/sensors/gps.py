@@ -1,13 +1,22 @@
 """GPS
 
-Publishes robot pose information.
+Publishes robot pose information to '/bot/sensor/gps' and '/bot/pose'.
+
+`service/localization` corrects the pose with the lidar when it is loaded,
+it then publishes '/bot/pose' instead and sets `PUBLISH_POSE` to False.
 """
 
 from robot import robot, timestep
 import bus
+import messages
 import numpy as np
 
-pub = bus.Publisher('/bot/pose', np.ndarray)
+PUBLISH_POSE = True
+
+pub = bus.Publisher('/bot/pose', np.ndarray, queue_size=1,
+                    schema=messages.POSE_SCHEMA)
+pub_gps = bus.Publisher('/bot/sensor/gps', np.ndarray, queue_size=1,
+                        schema=messages.POSE_SCHEMA)
 
 # Enable GPS and compass localization
 gps = robot.getDevice("gps")
@@ -26,7 +35,10 @@ def update(_):
     # F compass coords are different from lab 5
     rad = ((np.arctan2(n[0], n[1])))
     pose_theta = rad
-    pub.publish(np.array([pose_x, pose_y, pose_theta]))
+    pose = np.array([pose_x, pose_y, pose_theta])
+    pub_gps.publish(pose)
+    if PUBLISH_POSE:
+        pub.publish(pose)
 
 
 #bus.inspect('/bot/pose', np.ndarray)
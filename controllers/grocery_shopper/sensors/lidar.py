@@ -1,12 +1,30 @@
 """Lidar
 
-Publishes lidar readings.
+Publishes lidar readings in three channels:
+- '/bot/sensor/lidar_raw'
+A `messages.Scan` with the raw ranges and the pose they were taken at.
+World coordinates are only computed if a subscriber asks for them.
+- '/bot/sensor/lidar'
+An Nx2 array of world coordinates. This is skipped if nobody subscribes.
+- '/bot/safety/clearance'
+The closest return in the left, front and right `SAFETY_SECTORS`, see
+`messages.CLEARANCE`. This is published every tick, ignoring the stages
+below, so the wheels can stop in time.
+
+Scans go through a few optional stages before being published:
+- Only every `LIDAR_RATE_DIVISOR` ticks is a scan taken.
+- World coordinate scans are dropped if the robot hasn't moved
+`LIDAR_MIN_MOVE` or turned `LIDAR_MIN_TURN` since the last published scan. Scans taken while parked are
+nearly identical, so this saves mapping a lot of work during grabs.
+- If `LIDAR_VOXEL_SIZE` is set, only one point per voxel is kept.
 """
 
 from robot import robot, timestep
 import bus
+import messages
 import math
 import numpy as np
+from utils.scan import voxel_downsample, pose_changed, sector_slices, sector_min
 
 # Enable LiDAR
 lidar = robot.getDevice('Hokuyo URG-04LX-UG01')
@@ -18,14 +36,35 @@ LIDAR_ANGLE_BINS = 667
 LIDAR_SENSOR_MAX_RANGE = 8  # Meter
 LIDAR_ANGLE_RANGE = math.radians(240)
 
+# publish a scan every N ticks
+LIDAR_RATE_DIVISOR = 1
+# drop scans unless the robot moved/turned this much, 0 to publish every scan
+LIDAR_MIN_MOVE = 0.01  # Meter
+LIDAR_MIN_TURN = math.radians(0.5)
+# downsample points to voxels of this size, None to keep all points
+# a mapping cell is `mapping.MAP_RESOLUTION` = 0.083 m wide
+LIDAR_VOXEL_SIZE = None  # Meter
+
 lidar_offsets = np.linspace(
     +LIDAR_ANGLE_RANGE / 2.0, -LIDAR_ANGLE_RANGE / 2.0, LIDAR_ANGLE_BINS
 )
 # Only keep lidar readings not blocked by robot chassis
 lidar_offsets = lidar_offsets[83: len(lidar_offsets) - 83]
+cos_offsets = np.cos(lidar_offsets)
+sin_offsets = np.sin(lidar_offsets)
+
+# (min_angle, max_angle) of the left, front and right clearance sectors
+SAFETY_SECTORS = [
+    (math.radians(20), math.radians(60)),
+    (math.radians(-20), math.radians(20)),
+    (math.radians(-60), math.radians(-20)),
+]
+safety_slices = sector_slices(lidar_offsets, SAFETY_SECTORS)
 
 
 pose_x, pose_y, pose_theta = 0, 0, 0
+tick_count = 0
+last_scan_pose = None
 
 
 @bus.subscribe('/bot/pose', np.ndarray)
@@ -34,28 +73,48 @@ def gps_data(data):
     pose_x, pose_y, pose_theta = data
 
 
-pub_lidar = bus.Publisher('/bot/sensor/lidar', list)
-
+pub_lidar = bus.Publisher('/bot/sensor/lidar', np.ndarray, queue_size=0,
+                          schema=messages.SCAN_SCHEMA)
+pub_lidar_raw = bus.Publisher(
+    '/bot/sensor/lidar_raw', messages.Scan, queue_size=0)
+pub_clearance = bus.Publisher('/bot/safety/clearance', np.ndarray, queue_size=1,
+                              schema=messages.CLEARANCE_SCHEMA)
 
-@bus.subscribe('/bot/cmd_tick', int)
-def get_lidar_readings(_):
-    readings = []
-    lidar_sensor_readings = lidar.getRangeImage()
-    lidar_sensor_readings = lidar_sensor_readings[83: len(
-        lidar_sensor_readings) - 83]
 
-    for alpha, rho in zip(lidar_offsets, lidar_sensor_readings):
-        if rho > LIDAR_SENSOR_MAX_RANGE:
-            continue
+def read_ranges() -> np.ndarray:
+    """Returns the lidar ranges, viewing the webots buffer when possible."""
+    try:
+        buffer = lidar.getRangeImage(data_type='buffer')
+        ranges = np.frombuffer(buffer, dtype=np.float32)
+    except TypeError:
+        # older webots versions only return a list
+        ranges = np.array(lidar.getRangeImage())
+    # Only keep lidar readings not blocked by robot chassis
+    return ranges[83: len(ranges) - 83]
 
-        # The Webots coordinate system doesn't match the robot-centric axes we're used to
-        rx = math.cos(alpha) * rho + 0.202
-        ry = math.sin(alpha) * rho - 0.004
-
-        # Convert detection from robot coordinates into world coordinates
-        wx = math.cos(pose_theta) * rx - math.sin(pose_theta) * ry + pose_x
-        wy = math.sin(pose_theta) * rx + math.cos(pose_theta) * ry + pose_y
-
-        readings.append([wx, wy])
 
+@bus.subscribe('/bot/cmd_tick', int)
+def get_lidar_readings(_):
+    global tick_count, last_scan_pose
+    ranges = read_ranges()
+    pub_clearance.publish(sector_min(ranges, safety_slices))
+
+    tick_count += 1
+    if tick_count % LIDAR_RATE_DIVISOR != 0:
+        return
+
+    pose = (pose_x, pose_y, pose_theta)
+    scan = messages.Scan(ranges, pose, cos_offsets,
+                         sin_offsets, LIDAR_SENSOR_MAX_RANGE)
+    pub_lidar_raw.publish(scan)
+
+    if not pub_lidar.has_subscribers():
+        return
+    if not pose_changed(pose, last_scan_pose, LIDAR_MIN_MOVE, LIDAR_MIN_TURN):
+        return
+    last_scan_pose = pose
+
+    readings = scan.world
+    if LIDAR_VOXEL_SIZE is not None:
+        readings = voxel_downsample(readings, LIDAR_VOXEL_SIZE)
     pub_lidar.publish(readings)
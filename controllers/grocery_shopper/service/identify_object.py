@@ -1,10 +1,25 @@
 """Identify Object
 
-This service receives an event when the robot targets an object.
-It then associates it with an id based on its location, then prints it. 
+This service keeps a registry of the objects the robot has found. Objects
+are identified by their location: anything within `ASSOCIATION_RADIUS` of
+a registered object is the same object.
+
+Every object has a status:
+- SEEN: detected by the camera, '/bot/task/seen_objects'
+- TARGETED: picked by the behaviour tree, '/bot/task/detect_object'
+- GRASPED, DROPPED, UNREACHABLE: reported by the behaviour tree for the
+last targeted object, '/bot/task/object_status'. DROPPED means the gripper
+closed on nothing or lost the object.
+
+Objects in `DONE_STATUSES` should not be targeted again, see `is_done`.
+A DROPPED object is tried again until it has been dropped `MAX_DROPS`
+times, then it is UNREACHABLE.
+
+The registry is saved to and loaded from `OBJECTS_FILE` with the
+'/bot/cmd_objects' topic ('save' or 'load').
 
 Since objects are identified based on location, a single cube can be given
-multiple ids.
+multiple ids if it moves.
 """
 import numpy as np
 import bus
@@ -13,19 +28,141 @@ import logging
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+SEEN = 'seen'
+TARGETED = 'targeted'
+GRASPED = 'grasped'
+DROPPED = 'dropped'
+UNREACHABLE = 'unreachable'
+STATUSES = (SEEN, TARGETED, GRASPED, DROPPED, UNREACHABLE)
+DONE_STATUSES = (GRASPED, UNREACHABLE)
+
+ASSOCIATION_RADIUS = 0.4  # Meter
+MAX_DROPS = 2
+OBJECTS_FILE = 'objects.npz'
+
+
+class ObjectRegistry:
+    """Objects found by the robot, looked up by position.
+
+    Objects are hashed into a grid of square cells `radius` wide by their
+    x, y position, so finding the object at a position only checks the
+    3x3 cells around it.
+    """
+
+    def __init__(self, radius: float = ASSOCIATION_RADIUS):
+        self.radius = radius
+        self.positions = []
+        self.statuses = []
+        self.grid = {}
+
+    def __len__(self):
+        return len(self.positions)
+
+    def cell(self, position) -> tuple:
+        return (int(np.floor(position[0] / self.radius)),
+                int(np.floor(position[1] / self.radius)))
+
+    def find(self, position) -> int:
+        """Returns the id of the closest object within `radius`, -1 if none."""
+        cx, cy = self.cell(position)
+        best_id, best_dist = -1, self.radius
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for object_id in self.grid.get((cx + dx, cy + dy), ()):
+                    dist = np.linalg.norm(self.positions[object_id] - position)
+                    if dist < best_dist:
+                        best_id, best_dist = object_id, dist
+        return best_id
+
+    def add(self, position, status: str = SEEN) -> int:
+        """Register a new object, returns its id."""
+        object_id = len(self.positions)
+        self.positions.append(np.array(position, dtype=np.float64))
+        self.statuses.append(status)
+        self.grid.setdefault(self.cell(position), []).append(object_id)
+        return object_id
+
+    def observe(self, position) -> int:
+        """Returns the id of the object at `position`, registering it if new."""
+        object_id = self.find(position)
+        if object_id == -1:
+            object_id = self.add(position)
+            logger.info(f'Registering object #{object_id+1} at {position}')
+        return object_id
+
+    def set_status(self, object_id: int, status: str):
+        if status not in STATUSES:
+            raise ValueError(f'unknown object status {status}')
+        self.statuses[object_id] = status
 
-detected_objects = []
+    def is_done(self, positions: np.ndarray) -> np.ndarray:
+        """Bool for each of the Nx3 `positions`, True if it is a done object."""
+        done = np.zeros(len(positions), dtype=bool)
+        for i, position in enumerate(positions):
+            object_id = self.find(position)
+            done[i] = object_id != -1 and self.statuses[object_id] in DONE_STATUSES
+        return done
+
+    def save(self, path: str):
+        np.savez(path, positions=np.reshape(self.positions, (-1, 3)),
+                 statuses=np.array(self.statuses, dtype=str))
+
+    def load(self, path: str):
+        data = np.load(path)
+        self.positions, self.statuses, self.grid = [], [], {}
+        for position, status in zip(data['positions'], data['statuses']):
+            self.add(position, str(status))
+
+
+registry = ObjectRegistry()
+target_id = -1
+# number of times each object id was dropped
+drop_counts = {}
+
+
+def is_done(positions: np.ndarray) -> np.ndarray:
+    """Bool for each of the Nx3 world `positions`, True if already handled."""
+    return registry.is_done(positions)
+
+
+@bus.subscribe('/bot/task/seen_objects', np.ndarray)
+def seen_objects(positions):
+    for position in positions:
+        registry.observe(position)
 
 
 @bus.subscribe('/bot/task/detect_object', np.ndarray)
 def detect_object(object_location):
-    object_id = -1
-    for i, ref_object in enumerate(detected_objects):
-        if np.linalg.norm(ref_object - object_location) < 0.4:
-            object_id = i
-            logger.info(f'Detected object #{object_id+1}')
-
-    if object_id == -1:
-        object_id = len(detected_objects)
-        detected_objects.append(object_location)
-        logger.info(f'Registering object #{object_id+1} at {object_location}')
+    global target_id
+    target_id = registry.observe(object_location)
+    logger.info(f'Detected object #{target_id+1}')
+    if registry.statuses[target_id] not in DONE_STATUSES:
+        registry.set_status(target_id, TARGETED)
+
+
+@bus.subscribe('/bot/task/object_status', str)
+def object_status(status):
+    if target_id == -1:
+        logger.warning(f'No targeted object to set {status}')
+        return
+    if status == DROPPED:
+        drop_counts[target_id] = drop_counts.get(target_id, 0) + 1
+        if drop_counts[target_id] >= MAX_DROPS:
+            logger.info(f'Object #{target_id+1} dropped {MAX_DROPS} times, giving up')
+            status = UNREACHABLE
+    registry.set_status(target_id, status)
+    logger.info(f'Object #{target_id+1} {status}')
+
+
+@bus.subscribe('/bot/cmd_objects', str)
+def cmd_objects(cmd):
+    if cmd == 'load':
+        try:
+            registry.load(OBJECTS_FILE)
+            logger.info(f'Loaded {len(registry)} objects')
+        except FileNotFoundError:
+            logger.warning(f'No {OBJECTS_FILE} to load objects from')
+
+    if cmd == 'save':
+        logger.info(f'Saving {len(registry)} objects...')
+        registry.save(OBJECTS_FILE)
@@ -0,0 +1,136 @@
+"""Scan matching localization
+
+Corrects the GPS pose by aligning lidar scans with the occupancy map from
+`service/mapping`, and publishes the result to '/bot/pose'. Loading this
+module stops `sensors/gps` from publishing '/bot/pose' itself.
+
+Every tick the pose estimate is moved by however much the GPS moved since
+the last tick, then refined by matching the newest '/bot/sensor/lidar_raw'
+scan against a distance field of the map, see `utils/scan_match`.
+The GPS pose is used instead when:
+- there is no map yet,
+- less than `MIN_QUALITY` of the scan points line up with the map,
+- the match doesn't pin down the position in any direction, see below,
+- the match is more than `MAX_CORRECTION` meters away from the GPS,
+- the match heading is more than `MAX_HEADING_CORRECTION` off the GPS.
+
+Scans that only see parallel shelves line up with the map just as well
+anywhere along the aisle, so quality can't catch a match that slid along
+it. The position is only corrected along directions where the match
+information is at least `MIN_INFORMATION`, along the others the GPS
+position is kept, see `utils.scan_match.constrain`.
+
+The distance field is rebuilt whenever `mapping.get_map_data` returns a new
+map, so it follows the log-odds map too.
+
+This runs after the sensors each tick, so modules that read '/bot/pose'
+during the tick, like `sensors/lidar`, see the previous tick's estimate.
+
+Run `benchmarks/bench_localization.py` to measure matching offline.
+"""
+
+import logging
+import numpy as np
+import bus
+import messages
+import sensors.gps as gps
+from service import mapping
+from utils.scan import scan_to_robot
+from utils.scan_match import DistanceField, match_scan, constrain
+
+logger = logging.getLogger(__name__)
+
+# fraction of scan points that must be within `INLIER_DISTANCE` of the map
+MIN_QUALITY = 0.6
+INLIER_DISTANCE = 0.1  # Meter
+MAX_CORRECTION = 0.5  # Meter
+MAX_HEADING_CORRECTION = np.radians(10)
+# smallest eigenvalue of the position information to trust a direction
+MIN_INFORMATION = 0.01
+# only match every Nth beam, 1 to use the whole scan
+BEAM_STEP = 2
+
+gps.PUBLISH_POSE = False
+
+pub = bus.Publisher('/bot/pose', np.ndarray, queue_size=1,
+                    schema=messages.POSE_SCHEMA)
+
+gps_pose = None
+last_gps_pose = None
+estimate = None
+scan = None
+
+field = None
+field_map = None
+
+
+@bus.subscribe('/bot/sensor/gps', np.ndarray)
+def gps_data(data):
+    global gps_pose
+    gps_pose = data
+
+
+@bus.subscribe('/bot/sensor/lidar_raw', messages.Scan)
+def lidar_raw(data):
+    global scan
+    scan = data
+
+
+def get_field():
+    """Returns the distance field of the current map, None without a map."""
+    global field, field_map
+    map_data = mapping.get_map_data()
+    if map_data is not field_map:
+        field_map = map_data
+        try:
+            field = DistanceField(field_map, mapping.grid.resolution,
+                                  mapping.grid.origin)
+        except ValueError:
+            field = None
+    return field
+
+
+def predict() -> np.ndarray:
+    """Moves the estimate by the change in GPS pose since the last tick."""
+    delta = gps_pose - last_gps_pose
+    delta[2] = (delta[2] + np.pi) % (2 * np.pi) - np.pi
+    return estimate + delta
+
+
+@bus.subscribe('/bot/cmd_tick', int)
+def update(_):
+    global estimate, last_gps_pose, scan
+    if gps_pose is None:
+        return
+
+    if estimate is None:
+        estimate = gps_pose.copy()
+    else:
+        estimate = predict()
+    last_gps_pose = gps_pose
+
+    distance_field = get_field()
+    if scan is not None and distance_field is not None:
+        points = scan_to_robot(scan.ranges[::BEAM_STEP],
+                               scan.cos_offsets[::BEAM_STEP],
+                               scan.sin_offsets[::BEAM_STEP], scan.max_range)
+        scan = None
+
+        pose, quality, information = match_scan(
+            distance_field, points, estimate, inlier_distance=INLIER_DISTANCE)
+        pose, constrained = constrain(pose, gps_pose, information, MIN_INFORMATION)
+        correction = np.hypot(pose[0] - gps_pose[0], pose[1] - gps_pose[1])
+        heading_correction = abs((pose[2] - gps_pose[2] + np.pi) % (2 * np.pi) - np.pi)
+        if quality >= MIN_QUALITY and constrained > 0 and \
+                correction <= MAX_CORRECTION and \
+                heading_correction <= MAX_HEADING_CORRECTION:
+            pose[2] = (pose[2] + np.pi) % (2 * np.pi) - np.pi
+            estimate = pose
+        else:
+            logger.debug(f'scan match quality {quality:.2f}, '
+                         f'{constrained} constrained directions, '
+                         f'correction {correction:.2f} m '
+                         f'{np.degrees(heading_correction):.1f} deg, using gps')
+            estimate = gps_pose.copy()
+
+    pub.publish(estimate)
@@ -5,19 +5,39 @@ It also provides functionality to generate a map when the robot wanders
 around the map.
 
 This file provides variables:
+    * grid - `GridMap` of map_data, its bounds and resolution
     * map_data[a][b] - 2d array, 1 for obstacles and 0 for free space
     * map_width - width of map_data
     * map_height - height of map_data
+    * map_version - incremented every time map_data is rebuilt
 
 This file provides functions:
     * coords_map_to_world((a, b)): (x, y) - converts map indexes to world coordinates
     * coords_world_to_map((x, y)): (a, b) - converts world coordinates to map indexes
+    * get_map_data() - map_data, rebuilt first if the map changed since
+    * get_cspace() - map_data with the obstacles grown for path planning
+
+With `MAP_MODE = 'log_odds'` the map is a log-odds occupancy grid updated
+with every '/bot/sensor/lidar_raw' scan, including the free space along
+each beam. `map_data` is then only rebuilt when `get_map_data` is called.
+
+The map covers `WORLD_MIN_X`..`WORLD_MAX_X` by `WORLD_MIN_Y`..`WORLD_MAX_Y`
+with square cells `MAP_RESOLUTION` meters wide. The display always shows the
+30 m x 30 m `display_grid`, so finer maps are drawn downsampled. Maps saved
+on the original 360x360 grid are resampled onto `grid` when loaded.
+
+The configuration space from `get_cspace` is cached against `map_version`
+and only the tiles of map_data that changed are recomputed, see
+`utils.grid.Inflation`.
 """
 
 import logging
 import matplotlib.pyplot as plt
 import numpy as np
 import bus
+import messages
+from utils.grid import GridMap, Inflation, accumulate, update_log_odds
+from utils.scan import scan_to_robot, robot_to_world, LIDAR_OFFSET_X, LIDAR_OFFSET_Y
 
 pose_x, pose_y, pose_theta = 0, 0, 0
 
@@ -39,90 +59,177 @@ WORLD_MIN_X = -15
 WORLD_MAX_X = 15
 WORLD_MIN_Y = -8
 WORLD_MAX_Y = 8
+MAP_RESOLUTION = 30 / 360  # Meter per cell
+
+
+# 'raw' counts lidar hits per cell, 'log_odds' keeps a log-odds occupancy
+# grid that also clears the free space along each beam
+MAP_MODE = 'raw'
+
+# added to a cell every time a lidar point lands in it
+HIT_INCREMENT = 5e-3
+
+# log-odds added for a beam ending in a cell, removed for a beam crossing it
+LOG_ODDS_HIT = 0.85
+LOG_ODDS_FREE = 0.4
+LOG_ODDS_MIN = -2.0
+LOG_ODDS_MAX = 3.5
 
+# obstacles are grown by a square this wide for path planning, cells where
+# more than INFLATION_THRESHOLD of the square is obstacles are blocked
+INFLATION_WIDTH = 1.25  # Meter
+INFLATION_THRESHOLD = 0.01
 
-map_width = DISPLAY_DIM
-map_height = DISPLAY_DIM
-map_data = np.zeros((map_width, map_height))
-dirty = False
+# the display is redrawn at most this often
+DISPLAY_PERIOD = 200  # ms
+# BGRA color of the robot trail
+ROBOT_COLOR = np.array([0, 0, 255, 255], dtype=np.uint8)
+
+# the 360x360 grid of the original maps, which the display also shows
+LEGACY_GRID = GridMap(-15, 15, -15, 15, 30 / 360)
+display_grid = LEGACY_GRID
+
+grid = GridMap(WORLD_MIN_X, WORLD_MAX_X, WORLD_MIN_Y, WORLD_MAX_Y, MAP_RESOLUTION)
+map_width = grid.width
+map_height = grid.height
+map_data = np.zeros(grid.shape)
+map_version = 0
+
+inflation = Inflation(round(INFLATION_WIDTH / grid.resolution), INFLATION_THRESHOLD)
+cspace_version = -1
 
 
 def coords_world_to_map(pos):
-    x, y = pos
-    new_x = int((x / (WORLD_MAX_X - WORLD_MIN_X) + 0.5) * DISPLAY_DIM)
-    new_y = int((y / (WORLD_MAX_X - WORLD_MIN_X) + 0.5) * DISPLAY_DIM)
-    if new_x < 0 or new_x >= DISPLAY_DIM:
+    x, y = grid.world_to_cell(pos)
+    if not 0 <= x < grid.width:
         raise Exception('x out of bounds')
-    if new_y < 0 or new_y >= DISPLAY_DIM:
+    if not 0 <= y < grid.height:
         raise Exception('y out of bounds')
-    return new_x, new_y
+    return int(x), int(y)
 
 
 def coords_map_to_world(map_pos):
-    x, y = map_pos
-    new_x = ((x / DISPLAY_DIM) - 0.5) * (WORLD_MAX_X - WORLD_MIN_X)
-    new_y = ((y / DISPLAY_DIM) - 0.5) * (WORLD_MAX_X - WORLD_MIN_X)
+    new_x, new_y = grid.map_to_world(map_pos)
     return new_x, new_y
 
 
+def load_raw_map() -> np.ndarray:
+    """Load `raw_map.npy`, resampled onto `grid` if it was saved on the legacy grid."""
+    raw_map = np.load('raw_map.npy')
+    if raw_map.shape == grid.shape:
+        return raw_map
+    if raw_map.shape == LEGACY_GRID.shape:
+        logger.info(f'Resampling {LEGACY_GRID} map onto {grid}')
+        return grid.resample(raw_map, LEGACY_GRID)
+    raise ValueError(f'raw_map.npy has shape {raw_map.shape}, expected {grid.shape}')
+
+
 class ManualMapper:
+    """Builds `raw_map` from lidar readings and draws it on the display.
+
+    Drawing goes into `image`, a BGRA copy of the display. The region that
+    changed is pasted onto the display at most every `DISPLAY_PERIOD` ms.
+    """
+
     def __init__(self):
         self.raw_map = np.zeros(map_data.shape)
+        self.image = np.zeros((DISPLAY_DIM, DISPLAY_DIM, 4), dtype=np.uint8)
+        self.image[:, :, 3] = 255
+        # changed display region (x0, y0, x1, y1), None if nothing changed
+        self.dirty_rect = None
+        self.since_refresh = 0
+        # raw_map changed since map_data was last built
+        self.changed = False
+
+    def draw_cells(self, xs: np.ndarray, ys: np.ndarray, colors: np.ndarray):
+        """Draw map cells on the display image, `colors` is Nx4 or 4 BGRA bytes.
+
+        Each cell is drawn on the display pixel under its center, when several
+        cells share a pixel the last one drawn shows.
+        """
+        centers = grid.map_to_world(np.column_stack((xs, ys)), center=True)
+        indexes, inside = display_grid.world_to_map(centers)
+        # display is adjusted so the orientation matches viewport window
+        px = DISPLAY_DIM - indexes[:, 1]
+        py = DISPLAY_DIM - indexes[:, 0]
+        # cells on the 0 row/column land just outside the display
+        visible = inside & (px < DISPLAY_DIM) & (py < DISPLAY_DIM)
+        if not visible.any():
+            return
+        if np.ndim(colors) == 2:
+            colors = colors[visible]
+        px, py = px[visible], py[visible]
+        self.image[py, px] = colors
+
+        rect = (px.min(), py.min(), px.max() + 1, py.max() + 1)
+        if self.dirty_rect is not None:
+            x0, y0, x1, y1 = self.dirty_rect
+            rect = (min(x0, rect[0]), min(y0, rect[1]),
+                    max(x1, rect[2]), max(y1, rect[3]))
+        self.dirty_rect = rect
+
+    def draw_map_cells(self, xs: np.ndarray, ys: np.ndarray):
+        """Draw map cells in gray scale by their raw map value."""
+        g = (self.raw_map[ys, xs] * 254).astype(np.uint8)
+        colors = np.empty((len(g), 4), dtype=np.uint8)
+        colors[:, :3] = g[:, np.newaxis]
+        colors[:, 3] = 255
+        self.draw_cells(xs, ys, colors)
+
+    def refresh(self, elapsed: int = 0):
+        """Paste the changed region onto the display, if it is time to."""
+        self.since_refresh += elapsed
+        if self.dirty_rect is None or self.since_refresh < DISPLAY_PERIOD:
+            return
+
+        from robot import display
+        from controller import Display
+        x0, y0, x1, y1 = self.dirty_rect
+        region = np.ascontiguousarray(self.image[y0:y1, x0:x1])
+        image_ref = display.imageNew(region.tobytes(), Display.BGRA,
+                                     x1 - x0, y1 - y0)
+        display.imagePaste(image_ref, x0, y0, False)
+        display.imageDelete(image_ref)
+
+        self.dirty_rect = None
+        self.since_refresh = 0
 
     def update(self, readings):
         """Update internal raw map data"""
-        from robot import display
         try:
             robot_x, robot_y = coords_world_to_map((pose_x, pose_y))
-            # Draw the robot's current pose on the 360x360 display
-            display.setColor(int(0xFF0000))
-            # display is adjusted so the orientation matches viewport window
-            display.drawPixel(DISPLAY_DIM - robot_y, DISPLAY_DIM - robot_x)
-        except Exception as e:
-            logger.error(e)
-        try:
-            readings = [coords_world_to_map(pos) for pos in readings]
+            # Draw the robot's current pose on the display
+            self.draw_cells([robot_x], [robot_y], ROBOT_COLOR)
         except Exception as e:
             logger.error(e)
 
-        for x, y in readings:
-            # gray scale lidar readings
-            g = self.raw_map[y][x] + 5e-3
-            g = self.raw_map[y][x] = max(0, min(1, g))
-
-            color = int((int(g * 254) << 16) +
-                        (int(g * 254) << 8) + int(g * 254))
-
-            display.setColor(color)
-            # display is adjusted so the orientation matches viewport window
-            display.drawPixel(DISPLAY_DIM - y, DISPLAY_DIM - x)
+        indexes, valid = grid.world_to_map(readings)
+        if not valid.all():
+            logger.error(f'{np.count_nonzero(~valid)} lidar points out of bounds')
+        hit = accumulate(self.raw_map, indexes[valid], HIT_INCREMENT)
+        # gray scale lidar readings
+        self.draw_map_cells(hit[:, 0], hit[:, 1])
 
     def update_map_data(self):
         """Process raw_map then save to map_data"""
 
         raw_map = self.raw_map.copy()
 
-        global map_data, dirty
+        global map_data, map_version
         map_data = (raw_map > 0.7) * 1
-        dirty = True
+        map_version += 1
+        self.changed = False
 
     def load(self):
         """Load raw map data from `raw_map.npy`"""
 
-        from robot import display
         logger.info('Loading map...')
-        self.raw_map = np.load('raw_map.npy')
+        self.raw_map = load_raw_map()
         # plt.imshow(self.raw_map)
         # plt.show()
-        for y in range(DISPLAY_DIM):
-            for x in range(DISPLAY_DIM):
-                g = self.raw_map[y][x]
-                color = int((int(g * 254) << 16) +
-                            (int(g * 254) << 8) + int(g * 254))
-
-                display.setColor(color)
-                # display is adjusted so the orientation matches viewport window
-                display.drawPixel(DISPLAY_DIM - y, DISPLAY_DIM - x)
+        ys, xs = np.indices(self.raw_map.shape).reshape(2, -1)
+        self.draw_map_cells(xs, ys)
+        self.refresh(DISPLAY_PERIOD)
 
         self.update_map_data()
 
@@ -137,7 +244,80 @@ class ManualMapper:
                 'Map cannot save because the mapping module is locked.')
 
 
-mapper = ManualMapper()
+class LogOddsMapper(ManualMapper):
+    """Builds a log-odds occupancy grid from raw lidar scans.
+
+    `raw_map` holds the occupancy probability of each cell, so drawing,
+    saving and `map_data` work like `ManualMapper`. Each scan also lowers
+    the log-odds of the cells each beam passes through, up to the max range
+    for beams that hit nothing, so obstacles that moved away are cleared.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.log_odds = np.zeros(map_data.shape)
+        self.changed = False
+
+    def update(self, scan: messages.Scan):
+        """Update the log-odds grid with a scan"""
+        try:
+            robot_x, robot_y = coords_world_to_map(scan.pose[:2])
+            self.draw_cells([robot_x], [robot_y], ROBOT_COLOR)
+        except Exception as e:
+            logger.error(e)
+
+        ranges = np.asarray(scan.ranges, dtype=np.float64)
+        is_hit = ranges <= scan.max_range
+        ranges = np.where(is_hit, ranges, scan.max_range)
+        ranges[np.isnan(scan.ranges)] = np.nan
+        ends = robot_to_world(scan_to_robot(
+            ranges, scan.cos_offsets, scan.sin_offsets, np.inf), scan.pose)
+        lidar = robot_to_world(
+            np.array([[LIDAR_OFFSET_X, LIDAR_OFFSET_Y]]), scan.pose)[0]
+
+        changed = update_log_odds(
+            self.log_odds, grid.world_to_cell(lidar), grid.world_to_cell(ends),
+            LOG_ODDS_HIT, LOG_ODDS_FREE, LOG_ODDS_MIN, LOG_ODDS_MAX, is_hit)
+
+        xs, ys = changed[:, 0], changed[:, 1]
+        self.raw_map[ys, xs] = 1 / (1 + np.exp(-self.log_odds[ys, xs]))
+        self.draw_map_cells(xs, ys)
+        self.changed = True
+
+    def load(self):
+        """Load the obstacles in `raw_map.npy`, everything else is unknown"""
+        logger.info('Loading map...')
+        occupied = load_raw_map() > 0.7
+        self.log_odds = np.where(occupied, LOG_ODDS_MAX, 0.0)
+        self.raw_map = 1 / (1 + np.exp(-self.log_odds))
+        ys, xs = np.indices(self.raw_map.shape).reshape(2, -1)
+        self.draw_map_cells(xs, ys)
+        self.refresh(DISPLAY_PERIOD)
+
+        self.update_map_data()
+
+
+mapper = LogOddsMapper() if MAP_MODE == 'log_odds' else ManualMapper()
+
+
+def get_map_data():
+    """Returns `map_data`, first rebuilding it if the map changed since."""
+    if mapper.changed:
+        mapper.update_map_data()
+    return map_data
+
+
+def get_cspace():
+    """Returns the configuration space, 1 near obstacles and 0 for free space.
+
+    The array is updated in place when the map changes, don't modify it.
+    """
+    global cspace_version
+    data = get_map_data()
+    if cspace_version != map_version:
+        inflation.update(data)
+        cspace_version = map_version
+    return inflation.blocked
 
 
 @bus.subscribe('/bot/cmd_map', str)
@@ -149,6 +329,16 @@ def cmd_map(cmd):
         mapper.save()
 
 
-@bus.subscribe('/bot/sensor/lidar', list)
-def update_map(readings):
-    mapper.update(readings)
+if MAP_MODE == 'log_odds':
+    @bus.subscribe('/bot/sensor/lidar_raw', messages.Scan)
+    def update_map(scan):
+        mapper.update(scan)
+else:
+    @bus.subscribe('/bot/sensor/lidar', np.ndarray)
+    def update_map(readings):
+        mapper.update(readings)
+
+
+@bus.subscribe('/bot/cmd_tick', int)
+def refresh_display(timestep):
+    mapper.refresh(timestep)
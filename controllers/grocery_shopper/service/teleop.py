@@ -13,6 +13,8 @@ Other things:
 - "P" toggle precision mode, sets max speed for manual controls to 1/10.
 - "S" save map
 - "L" load map
+- "O" save object registry
+- "I" load object registry
 
 
 Also a lot of initialization code is in this module for some reason. 
@@ -35,10 +37,11 @@ keyboard.enable(timestep)
 
 left_wheel_pub = bus.Publisher('/bot/wheel/cmd_vel/left', float)
 right_wheel_pub = bus.Publisher('/bot/wheel/cmd_vel/right', float)
-autonomous_pub = bus.Publisher('/bot/cmd_auto', bool)
+autonomous_pub = bus.Publisher('/bot/cmd_auto', bool, queue_size=1)
 gripper_pub = bus.Publisher('/bot/cmd_gripper', bool)
 mapper_pub = bus.Publisher('/bot/cmd_map', str)
 mapper_pub.publish('load')
+objects_pub = bus.Publisher('/bot/cmd_objects', str)
 arm_pub = bus.Publisher('/bot/cmd_arm', str)
 autonomous_pub.publish(autonomous)
 gripper_pub.publish(True)
@@ -96,6 +99,10 @@ def update(delta):
         mapper_pub.publish('save')
     elif key == ord('L'):
         mapper_pub.publish('load')
+    elif key == ord('O'):
+        objects_pub.publish('save')
+    elif key == ord('I'):
+        objects_pub.publish('load')
     elif key == ord('A'):
         if auto_cooldown > 0:
             logger.debug('autonomous switching cooldown not finished')
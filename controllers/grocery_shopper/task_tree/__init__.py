@@ -11,6 +11,9 @@ appropriate position to trigger the previous branch.
 
 The `wander` branch can be used on its own to help generate a map of the world.
 
+The camera samples slowly unless a behaviour asks for fast recognition,
+see `camera_rate`. This saves simulation time during long grab sequences.
+
 This module create a bunch of different behaviour nodes that it needs to
 function.
 """
@@ -18,12 +21,14 @@ function.
 from .drive_to import DriveTo
 from .wait import Timer
 from . import find_object
+from . import camera_rate
+from service import identify_object
 from py_trees.composites import *
 import py_trees as pyt
 from py_trees.common import Status
 from .face_towards import FaceTowards
 from .arms import SetArms
-from .gripper import SetGripper
+from .gripper import SetGripper, CheckGrasp
 from .fowards import DriveForwards
 import bus
 import numpy as np
@@ -101,16 +106,17 @@ close_range_grab_object = Sequence(name='grab close range', children=[
 
 
     # drive into object, make sure to face object
-    DriveForwards(speed=1.0, cond=lambda: object_dist < 1.3),
+    # the shelf gets within the safety stop distance, so drive unguarded
+    DriveForwards(speed=1.0, guard=False, cond=lambda: object_dist < 1.3),
     FaceTowards(get_target=lambda: find_object.object_location),
 
-    DriveForwards(speed=1.0, cond=lambda: object_dist < 1.1),
+    DriveForwards(speed=1.0, guard=False, cond=lambda: object_dist < 1.1),
     FaceTowards(get_target=lambda: find_object.object_location),
 
-    DriveForwards(speed=1.0, cond=lambda: object_dist < 0.9),
+    DriveForwards(speed=1.0, guard=False, cond=lambda: object_dist < 0.9),
     FaceTowards(get_target=lambda: find_object.object_location),
 
-    DriveForwards(speed=1.0, cond=lambda: object_dist < 0.7),
+    DriveForwards(speed=1.0, guard=False, cond=lambda: object_dist < 0.7),
 
     # grab object
     DriveForwards(speed=0.0),
@@ -121,8 +127,11 @@ close_range_grab_object = Sequence(name='grab close range', children=[
     DriveForwards(speed=-1.0),
     Timer(ms=10_000),
 
-    # put object in basket
+    # give up if the object was missed or fell while backing away
     DriveForwards(speed=0.0),
+    CheckGrasp(),
+
+    # put object in basket
     SetArms(state='pre-basket'),
     Timer(ms=5_000),
 
@@ -140,8 +149,12 @@ close_range_grab_object = Sequence(name='grab close range', children=[
 long_range_grab_object = Sequence(name='grab long range', children=[
     # object_visible,
     find_object.FindObject(close_range=False),
-    # drive to object
-    DriveTo(get_position=in_front_of_object),
+    # drive to object, give up on it if there is no path
+    Selector(children=[
+        DriveTo(get_position=in_front_of_object),
+        find_object.SetObjectStatus(
+            identify_object.UNREACHABLE, result=Status.FAILURE),
+    ]),
     # face towards target
     FaceTowards(get_target=lambda: find_object.object_location),
 ])
@@ -163,6 +176,7 @@ def tick_root(_):
     global object_dist
     if autonomous:
         root.tick_once()
+        camera_rate.update()
         dx = find_object.object_location[0] - pose_x
         dy = find_object.object_location[1] - pose_y
         object_dist = np.linalg.norm([dx, dy])
@@ -0,0 +1,33 @@
+"""Camera rate
+
+Behaviours call `request_fast()` on every tick that they need fresh
+recognition objects. After the tree is ticked, `update()` publishes the
+camera period to '/bot/cmd_camera_period': `FAST_PERIOD` if anything asked
+for it during the tick, `SLOW_PERIOD` otherwise. The period is only
+published when it changes.
+"""
+import bus
+from robot import timestep
+
+FAST_PERIOD = timestep  # ms
+SLOW_PERIOD = 8 * timestep  # ms
+
+pub_camera_period = bus.Publisher('/bot/cmd_camera_period', int, queue_size=1)
+
+fast_requested = False
+current_period = None
+
+
+def request_fast():
+    global fast_requested
+    fast_requested = True
+
+
+def update():
+    global fast_requested, current_period
+    period = FAST_PERIOD if fast_requested else SLOW_PERIOD
+    fast_requested = False
+
+    if period != current_period:
+        current_period = period
+        pub_camera_period.publish(period)
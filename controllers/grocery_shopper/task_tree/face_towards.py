@@ -4,6 +4,7 @@ import numpy as np
 from utils.ease_func import ease_out_quad
 import logging
 import bus
+from . import camera_rate
 
 logger = logging.getLogger(__name__)
 # logger.setLevel(logging.DEBUG)
@@ -27,6 +28,7 @@ class FaceTowards(pyt.behaviour.Behaviour):
         self.get_target = get_target
 
     def update(self):
+        camera_rate.request_fast()
         target = self.get_target()
         relative_target = [target[0] - pose_x, target[1] - pose_y]
 
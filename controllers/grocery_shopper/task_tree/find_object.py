@@ -3,7 +3,10 @@ from py_trees.common import Status
 import logging
 import numpy as np
 import bus
-from utils.object_to_world import object_to_world
+import messages
+from utils.object_to_world import objects_to_world
+from service import identify_object
+from . import camera_rate
 
 logger = logging.getLogger(__name__)
 # logger.setLevel(logging.DEBUG)
@@ -13,6 +16,8 @@ object_location = [0, 0]
 pose_x, pose_y, pose_theta = 0, 0, 0
 
 pub_detect_object = bus.Publisher('/bot/task/detect_object', np.ndarray)
+pub_seen_objects = bus.Publisher('/bot/task/seen_objects', np.ndarray)
+pub_object_status = bus.Publisher('/bot/task/object_status', str)
 
 
 @bus.subscribe('/bot/pose', np.ndarray)
@@ -21,19 +26,39 @@ def gps_data(data):
     pose_x, pose_y, pose_theta = data
 
 
-detected_objects = []
+# Nx3 positions of target objects relative to the camera
+detected_objects = np.zeros((0, 3))
+# world positions of `detected_objects`, see `detected_world_positions`
+detected_world = None
+detected_world_pose = None
 
 
-@bus.subscribe('/bot/sensor/camera_rec', list)
+def detected_world_positions() -> np.ndarray:
+    """Nx3 world positions of `detected_objects`.
+
+    This is computed once per camera snapshot and pose, so every user
+    within a tick shares it.
+    """
+    global detected_world, detected_world_pose
+    pose = (pose_x, pose_y, pose_theta)
+    if detected_world is None or pose != detected_world_pose:
+        detected_world = objects_to_world(pose, detected_objects)
+        detected_world_pose = pose
+    return detected_world
+
+
+@bus.subscribe('/bot/sensor/camera_rec', np.ndarray, schema=messages.DETECTIONS_SCHEMA)
 def camera_data(objects):
-    global detected_objects
-    detected_objects = objects
+    global detected_objects, detected_world
+    detected_objects = messages.detection_positions(objects)
+    detected_world = None
 
-    for obj in objects:
-        world_pos = object_to_world(
-            [pose_x, pose_y, pose_theta], obj.position)
+    if len(detected_objects) > 0 and pub_seen_objects.has_subscribers():
+        pub_seen_objects.publish(detected_world_positions())
 
-        logger.debug(world_pos)
+    if logger.isEnabledFor(logging.DEBUG):
+        for world_pos in detected_world_positions():
+            logger.debug(world_pos)
 
 
 class FindObject(pyt.behaviour.Behaviour):
@@ -44,15 +69,22 @@ class FindObject(pyt.behaviour.Behaviour):
     def update(self):
         global object_location
 
-        for obj in detected_objects:
-            dist = np.linalg.norm(obj.position)
-            world_pos = object_to_world(
-                [pose_x, pose_y, pose_theta], obj.position)
+        # track candidates closely, otherwise slow sampling is enough to spot them
+        if len(detected_objects) > 0:
+            camera_rate.request_fast()
 
+        world_positions = detected_world_positions()
+        dists = np.linalg.norm(detected_objects, axis=1)
+        done = identify_object.is_done(world_positions)
+        for dist, world_pos, is_done in zip(dists, world_positions, done):
             # ignore objects on floor
             if world_pos[2] < -0.7:
                 continue
 
+            # ignore objects already collected or given up on
+            if is_done:
+                continue
+
             if not self.close_range:
                 if dist > 5 and dist < 10:
                     object_location = world_pos
@@ -69,3 +101,19 @@ class FindObject(pyt.behaviour.Behaviour):
 
         # find tree
         return Status.FAILURE
+
+
+class SetObjectStatus(pyt.behaviour.Behaviour):
+    """Report the status of the targeted object, see `service/identify_object`.
+
+    Returns `result`, so it can end a branch with FAILURE.
+    """
+
+    def __init__(self, status, result=Status.SUCCESS):
+        super().__init__(f'object {status}')
+        self.status = status
+        self.result = result
+
+    def update(self):
+        pub_object_status.publish(self.status)
+        return self.result
@@ -9,21 +9,32 @@ logger = logging.getLogger(__name__)
 
 left_wheel_pub = bus.Publisher('/bot/wheel/cmd_vel/left', float)
 right_wheel_pub = bus.Publisher('/bot/wheel/cmd_vel/right', float)
+safety_override_pub = bus.Publisher('/bot/safety/override', bool, queue_size=1)
 
 
 class DriveForwards(pyt.behaviour.Behaviour):
-    def __init__(self, speed=1.0, name='drive straight', timeout_ms=3_000, cond=None):
+    def __init__(self, speed=1.0, name='drive straight', timeout_ms=3_000, cond=None,
+                 guard=True):
+        """`guard=False` lifts the lidar safety clamp of `motors/wheel` while running."""
         super().__init__(name)
         self.timeout_ms = timeout_ms
         self.speed = speed
         self.cond = cond
+        self.guard = guard
 
     def initialise(self):
         self.time = 0
 
+    def terminate(self, new_status):
+        if not self.guard:
+            safety_override_pub.publish(False)
+
     def update(self):
         left_wheel_pub.publish(self.speed)
         right_wheel_pub.publish(self.speed)
+        if not self.guard:
+            # every tick, so it is set again when autonomous mode resumes
+            safety_override_pub.publish(True)
 
         self.time += timestep
         if self.time > self.timeout_ms:
@@ -3,11 +3,24 @@ from py_trees.common import Status
 import numpy as np
 import logging
 import bus
+from service import identify_object
 from utils.ease_func import ease_out_exp, ease_out_quad
 
 logger = logging.getLogger(__name__)
 
+# a closed finger further in than this is not holding anything
+GRASP_MIN_POSITION = 0.005  # Meter
+
 cmd_gripper = bus.Publisher('/bot/cmd_gripper', bool)
+pub_object_status = bus.Publisher('/bot/task/object_status', str)
+
+finger_positions = None
+
+
+@bus.subscribe('/bot/sensor/gripper', np.ndarray)
+def gripper_data(data):
+    global finger_positions
+    finger_positions = data
 
 
 class SetGripper(pyt.behaviour.Behaviour):
@@ -18,3 +31,25 @@ class SetGripper(pyt.behaviour.Behaviour):
     def update(self):
         cmd_gripper.publish(self.open_state)
         return Status.SUCCESS
+
+
+class CheckGrasp(pyt.behaviour.Behaviour):
+    """Report whether the closed gripper holds the targeted object.
+
+    Both fingers stop on the object when it is held, so the object is
+    GRASPED if they are further apart than `GRASP_MIN_POSITION` and DROPPED
+    otherwise. Fails when nothing is held.
+    """
+
+    def __init__(self, name='check grasp'):
+        super().__init__(name)
+
+    def update(self):
+        held = finger_positions is not None and \
+            bool((finger_positions > GRASP_MIN_POSITION).all())
+        if held:
+            pub_object_status.publish(identify_object.GRASPED)
+            return Status.SUCCESS
+        logger.info(f'Gripper is empty, fingers at {finger_positions}')
+        pub_object_status.publish(identify_object.DROPPED)
+        return Status.FAILURE
@@ -13,13 +13,10 @@ import matplotlib.pyplot as plt
 import math
 import random
 from service import mapping
-from scipy.signal import convolve2d
 
 import logging
 logger = logging.getLogger(__name__)
 
-CONV_SIZE = 15
-
 DEBUG = False
 
 ###############################################################################
@@ -46,7 +43,7 @@ def get_state_is_valid(map_data):
         :param state: n-Dimensional point
         :return: Boolean whose value depends on whether the state/point is valid or not
         '''
-        state_bounds = np.array([[0, 360], [0, 360]])
+        state_bounds = np.array([[0, mapping.map_width], [0, mapping.map_height]])
         for dim in range(state_bounds.shape[0]):
             if state[dim] < state_bounds[dim][0]:
                 return False
@@ -200,12 +197,10 @@ def plan_path(start_pos, target_pos: list[float]):
     start_p = np.array(start_p)
     logger.debug(f'plan path from {start_p} to {end_p}')
 
-    adj_map = convolve2d(mapping.map_data, np.ones((CONV_SIZE, CONV_SIZE)), mode='same',
-                         boundary='fill', fillvalue=1)
-    adj_map = (adj_map > (CONV_SIZE**2 * 0.01)) * 1
+    adj_map = mapping.get_cspace()
 
     K = 1_000  # Feel free to adjust as desired
-    bounds = np.array([[0, 360], [0, 360]])
+    bounds = np.array([[0, mapping.map_width], [0, mapping.map_height]])
     state_is_valid = get_state_is_valid(adj_map)
 
     nodes, reached_target = rrt(bounds, state_is_valid, start_p,
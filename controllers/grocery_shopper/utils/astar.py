@@ -9,22 +9,19 @@ Path finding is called in task_tree/drive_to.py
 """
 import numpy as np
 from service import mapping
-from scipy.signal import convolve2d
 import matplotlib.pyplot as plt
 import logging
 
 logger = logging.getLogger(__name__)
 # logger.setLevel(logging.DEBUG)
 
-CONV_SIZE = 15
-
 # display waypoints on map
 DEBUG = False
 
 
 def a_star(map_data, start, end):
     '''
-    :param map: A 2D numpy array of size 360x360 representing the world's cspace with 0 as free space and 1 as obstacle
+    :param map: A 2D numpy array the size of the map representing the world's cspace with 0 as free space and 1 as obstacle
     :param start: A tuple of indices representing the start cell in the map
     :param end: A tuple of indices representing the end cell in the map
     :return: A list of tuples as a path from the given start to the given end in the given maze
@@ -109,9 +106,7 @@ def plan_path(start_pos, target_pos: list[float]):
     start_p = mapping.coords_world_to_map((start_pos[0], start_pos[1]))
     logger.debug(f'plan path from {start_p} to {end_p}')
 
-    adj_map = convolve2d(mapping.map_data, np.ones((CONV_SIZE, CONV_SIZE)), mode='same',
-                         boundary='fill', fillvalue=1)
-    adj_map = (adj_map > (CONV_SIZE**2 * 0.01)) * 1
+    adj_map = mapping.get_cspace()
 
     path = a_star(adj_map, start_p, end_p)
     path = smooth_path(path, adj_map)
@@ -0,0 +1,282 @@
+"""Occupancy grid processing
+
+Vectorized helpers for the mapping grid. These don't use webots so they
+can be used offline and benchmarked.
+
+This file provides:
+- GridMap(min_x, max_x, min_y, max_y, resolution) - grid geometry and
+world <-> map conversion of whole arrays
+- accumulate(grid, indexes, increment) - add to the cells hit by a scan
+- trace_rays(start, ends) -> (xs, ys) cells crossed by the rays
+- update_log_odds(log_odds, start, ends, ...) - log-odds update for a scan
+- box_sum(data, size, fill) - sum over the square around each cell
+- Inflation(size, threshold) - obstacles grown by a square, updated incrementally
+"""
+import math
+import numpy as np
+
+
+class GridMap:
+    """Geometry of a grid covering [min_x, max_x) x [min_y, max_y).
+
+    Cells are `resolution` meters wide. Arrays of the grid are indexed
+    `[y][x]` and have `shape == (height, width)`.
+    """
+
+    def __init__(self, min_x: float, max_x: float, min_y: float, max_y: float,
+                 resolution: float):
+        self.min_x = min_x
+        self.max_x = max_x
+        self.min_y = min_y
+        self.max_y = max_y
+        self.resolution = resolution
+        # round first so float noise doesn't add a cell
+        self.width = math.ceil(round((max_x - min_x) / resolution, 6))
+        self.height = math.ceil(round((max_y - min_y) / resolution, 6))
+
+    def __repr__(self):
+        return (f'GridMap(x=[{self.min_x}, {self.max_x}), y=[{self.min_y}, {self.max_y}), '
+                f'{self.resolution} m, {self.width}x{self.height})')
+
+    def __eq__(self, other):
+        return isinstance(other, GridMap) and \
+            (self.min_x, self.min_y, self.resolution, self.shape) == \
+            (other.min_x, other.min_y, other.resolution, other.shape)
+
+    @property
+    def shape(self) -> tuple:
+        return self.height, self.width
+
+    @property
+    def origin(self) -> tuple:
+        """Continuous map coordinates of world (0, 0)."""
+        return -self.min_x / self.resolution, -self.min_y / self.resolution
+
+
+    def world_to_cell(self, points) -> np.ndarray:
+        """
+        Convert world coordinates to continuous map coordinates, cell (x, y)
+        covers [x, x + 1) x [y, y + 1).
+
+        :param points: float array of (x, y) world coordinates, Nx2 or one point
+        :return: float array of (x, y) map coordinates, the same shape as `points`
+        """
+        cells = np.array(points, dtype=np.float64)
+        cells[..., 0] -= self.min_x
+        cells[..., 1] -= self.min_y
+        cells /= self.resolution
+        return cells
+
+    def world_to_map(self, points):
+        """
+        Convert world coordinates to map indexes.
+
+        :param points: Nx2 float array of (x, y) world coordinates
+        :return: (indexes, valid) - Nx2 int array of (x, y) map indexes and a
+        mask of the points inside the map
+        """
+        indexes = np.floor(self.world_to_cell(np.reshape(points, (-1, 2))))
+        valid = (indexes[:, 0] >= 0) & (indexes[:, 0] < self.width) & \
+            (indexes[:, 1] >= 0) & (indexes[:, 1] < self.height)
+        # NaN can't be cast to int
+        indexes[~valid] = 0
+        return indexes.astype(np.intp), valid
+
+    def map_to_world(self, indexes, center: bool = False) -> np.ndarray:
+        """
+        Convert map indexes to world coordinates.
+
+        :param indexes: array of (x, y) map indexes, Nx2 or one index
+        :param center: give the center of the cells instead of their min corner
+        :return: float array of (x, y) world coordinates, the same shape as `indexes`
+        """
+        points = np.array(indexes, dtype=np.float64)
+        if center:
+            points += 0.5
+        points *= self.resolution
+        points[..., 0] += self.min_x
+        points[..., 1] += self.min_y
+        return points
+
+    def resample(self, data: np.ndarray, source: 'GridMap', fill=0) -> np.ndarray:
+        """
+        Resample `data` covering the `source` grid onto this grid. Each cell
+        takes the value of the source cell under its center, cells outside of
+        `source` are `fill`.
+        """
+        if source == self:
+            return data.copy()
+        ys, xs = np.indices(self.shape).reshape(2, -1)
+        centers = self.map_to_world(np.column_stack((xs, ys)), center=True)
+        indexes, valid = source.world_to_map(centers)
+        resampled = np.full(self.height * self.width, fill, dtype=data.dtype)
+        resampled[valid] = data[indexes[valid, 1], indexes[valid, 0]]
+        return resampled.reshape(self.shape)
+
+
+def accumulate(grid: np.ndarray, indexes: np.ndarray, increment: float) -> np.ndarray:
+    """
+    Add `increment` to `grid[y][x]` for every (x, y) in `indexes`, clamped to [0, 1].
+
+    A cell hit several times is incremented several times.
+
+    :param grid: 2d float array, updated in place
+    :param indexes: Nx2 int array of (x, y) map indexes inside the grid
+    :param increment: amount added per hit
+    :return: Mx2 int array of the (x, y) cells that were hit, each once
+    """
+    rows, cols = indexes[:, 1], indexes[:, 0]
+    np.add.at(grid, (rows, cols), increment)
+    # only the cells that were hit can be out of range
+    grid[rows, cols] = np.clip(grid[rows, cols], 0, 1)
+
+    cells = np.unique(rows * grid.shape[1] + cols)
+    hit = np.empty((len(cells), 2), dtype=np.intp)
+    hit[:, 0] = cells % grid.shape[1]
+    hit[:, 1] = cells // grid.shape[1]
+    return hit
+
+
+
+def trace_rays(start, ends: np.ndarray):
+    """
+    Cells crossed by the rays from `start` to each of `ends`. All rays are
+    traced at once with a DDA that takes one step per cell along the major
+    axis of each ray, the end point itself is not included.
+
+    :param start: (x, y) map coordinates of the ray origin
+    :param ends: Nx2 float array of map coordinates of the ray ends
+    :return: (xs, ys) - int arrays of the cells, cells crossed by several
+    rays are repeated
+    """
+    dx = ends[:, 0] - start[0]
+    dy = ends[:, 1] - start[1]
+    steps = np.ceil(np.maximum(np.abs(dx), np.abs(dy))).astype(np.intp)
+    steps[steps == 0] = 1
+
+    # t goes 0, 1, .. steps - 1 for every ray
+    first = np.cumsum(steps) - steps
+    t = np.arange(steps.sum()) - np.repeat(first, steps)
+    xs = np.floor(start[0] + np.repeat(dx / steps, steps) * t).astype(np.intp)
+    ys = np.floor(start[1] + np.repeat(dy / steps, steps) * t).astype(np.intp)
+    return xs, ys
+
+
+def update_log_odds(log_odds: np.ndarray, start, ends: np.ndarray, hit: float,
+                    free: float, min_value: float, max_value: float,
+                    is_hit: np.ndarray | None = None) -> np.ndarray:
+    """
+    Update a log-odds occupancy grid with a scan.
+
+    Cells crossed by a beam lose `free` once per scan, the cell a beam ends
+    in gains `hit` for every beam ending there instead. Values are clamped
+    to [min_value, max_value] so cells can change state again.
+
+    :param log_odds: 2d float array indexed [y][x], updated in place
+    :param start: (x, y) map coordinates of the lidar
+    :param ends: Nx2 float array of map coordinates of the beam ends
+    :param is_hit: N bools, False for beams that ended at max range without
+    hitting anything. These only clear cells. All beams hit if None.
+    :return: Mx2 int array of the (x, y) cells that changed, each once
+    """
+    rows, cols = log_odds.shape
+    finite = np.isfinite(ends).all(axis=1)
+    ends = ends[finite]
+    hit_ends = ends if is_hit is None else ends[is_hit[finite]]
+
+    xs, ys = trace_rays(start, ends)
+    crossed = (xs >= 0) & (xs < cols) & (ys >= 0) & (ys < rows)
+    hit_xs = np.floor(hit_ends[:, 0]).astype(np.intp)
+    hit_ys = np.floor(hit_ends[:, 1]).astype(np.intp)
+    inside = (hit_xs >= 0) & (hit_xs < cols) & (hit_ys >= 0) & (hit_ys < rows)
+    hits = hit_ys[inside] * cols + hit_xs[inside]
+
+    # a stamp of each cell is faster than np.unique
+    free_mask = np.zeros(log_odds.size, dtype=bool)
+    free_mask[ys[crossed] * cols + xs[crossed]] = True
+    free_mask[hits] = False
+
+    values = log_odds.reshape(-1)
+    values[free_mask] -= free
+    np.add.at(values, hits, hit)
+
+    free_mask[hits] = True
+    cells = np.flatnonzero(free_mask)
+    values[cells] = np.clip(values[cells], min_value, max_value)
+    changed = np.empty((len(cells), 2), dtype=np.intp)
+    changed[:, 0] = cells % cols
+    changed[:, 1] = cells // cols
+    return changed
+
+
+def _window_sum(padded: np.ndarray, size: int) -> np.ndarray:
+    """Sum over each size x size window fully inside `padded`, one axis at a time."""
+    for axis in (0, 1):
+        sums = np.cumsum(padded, axis=axis)
+        sums = np.insert(sums, 0, 0, axis=axis)
+        if axis == 0:
+            padded = sums[size:] - sums[:-size]
+        else:
+            padded = sums[:, size:] - sums[:, :-size]
+    return padded
+
+
+def box_sum(data: np.ndarray, size: int, fill=0) -> np.ndarray:
+    """
+    Sum of `data` over the size x size square around each cell, the same as
+    `convolve2d(data, np.ones((size, size)), mode='same', boundary='fill',
+    fillvalue=fill)`. The box filter is separable, so this takes a
+    cumulative sum along each axis instead of size^2 operations per cell.
+    """
+    before, after = size // 2, (size - 1) // 2
+    padded = np.pad(data, ((before, after), (before, after)), constant_values=fill)
+    return _window_sum(padded, size)
+
+
+class Inflation:
+    """Obstacles of an occupancy grid grown by a size x size square.
+
+    A cell is blocked when more than `threshold` of the square around it is
+    obstacles, cells outside of the grid count as obstacles. `update` only
+    recomputes the `tile` x `tile` cell tiles with changes since the last
+    update, plus the cells within reach of the square around them.
+    """
+
+    def __init__(self, size: int, threshold: float, tile: int = 32):
+        self.size = size
+        self.limit = size ** 2 * threshold
+        self.tile = tile
+        self.occupied = None
+        # 1 for blocked cells, 0 for free space
+        self.blocked = None
+
+    def update(self, occupied: np.ndarray) -> np.ndarray:
+        """Update with a new grid of 1 for obstacles and 0 for free space, returns `blocked`."""
+        occupied = np.array(occupied, dtype=np.int32)
+        if self.occupied is None or self.occupied.shape != occupied.shape:
+            self.blocked = (box_sum(occupied, self.size, 1) > self.limit) * 1
+            self.occupied = occupied
+            return self.blocked
+
+        rows, cols = np.nonzero(occupied != self.occupied)
+        self.occupied = occupied
+        if len(rows) == 0:
+            return self.blocked
+
+        height, width = occupied.shape
+        before, after = self.size // 2, (self.size - 1) // 2
+        tiles_x = -(-width // self.tile)
+        for tile in np.unique(rows // self.tile * tiles_x + cols // self.tile):
+            r0, c0 = tile // tiles_x * self.tile, tile % tiles_x * self.tile
+            # a changed cell affects the cells whose square covers it
+            y0, y1 = max(r0 - after, 0), min(r0 + self.tile + before, height)
+            x0, x1 = max(c0 - after, 0), min(c0 + self.tile + before, width)
+            # the squares of those cells, the part outside the grid is obstacles
+            top, bottom = y0 - before, y1 + after
+            left, right = x0 - before, x1 + after
+            window = np.pad(
+                occupied[max(top, 0):min(bottom, height), max(left, 0):min(right, width)],
+                ((max(-top, 0), max(bottom - height, 0)),
+                 (max(-left, 0), max(right - width, 0))), constant_values=1)
+            self.blocked[y0:y1, x0:x1] = _window_sum(window, self.size) > self.limit
+        return self.blocked
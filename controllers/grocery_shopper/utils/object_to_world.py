@@ -1,22 +1,31 @@
 import numpy as np
 
+CAMERA_OFFSET = 0.08
+
 
 def object_to_world(robot_pose, object_pose):
     """
     Convert position returned from camera recognition to world coordinates.
     """
+    return objects_to_world(robot_pose, np.reshape(object_pose, (1, 3)))[0]
 
-    pose_x, pose_y, pose_theta = robot_pose
-    obj_x, obj_y, obj_z = object_pose
-    camera_offset = 0.08
 
-    camera_x = np.cos(pose_theta) * camera_offset + pose_x
-    camera_y = np.sin(pose_theta) * camera_offset + pose_y
+def objects_to_world(robot_pose, object_poses):
+    """
+    Convert an Nx3 array of positions returned from camera recognition to
+    an Nx3 array of world coordinates.
+    """
+
+    pose_x, pose_y, pose_theta = robot_pose
+    object_poses = np.asarray(object_poses, dtype=np.float64)
+    c, s = np.cos(pose_theta), np.sin(pose_theta)
 
-    x = np.cos(pose_theta) * obj_x - \
-        np.sin(pose_theta) * obj_y + camera_x
-    y = np.sin(pose_theta) * obj_x + \
-        np.cos(pose_theta) * obj_y + camera_y
-    z = obj_z
+    camera_x = c * CAMERA_OFFSET + pose_x
+    camera_y = s * CAMERA_OFFSET + pose_y
 
-    return np.array([x, y, z])
+    obj_x, obj_y = object_poses[:, 0], object_poses[:, 1]
+    world = np.empty((len(object_poses), 3))
+    world[:, 0] = c * obj_x - s * obj_y + camera_x
+    world[:, 1] = s * obj_x + c * obj_y + camera_y
+    world[:, 2] = object_poses[:, 2]
+    return world
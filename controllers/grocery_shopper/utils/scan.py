@@ -0,0 +1,147 @@
+"""Lidar scan processing
+
+Vectorized helpers for lidar scans. These don't use webots so they can
+be used offline and benchmarked.
+
+This file provides:
+- scan_to_world(ranges, cos_offsets, sin_offsets, pose, max_range) -> Nx2 world points
+- scan_to_robot(ranges, cos_offsets, sin_offsets, max_range) -> Nx2 robot points
+- robot_to_world(points, pose) -> Nx2 world points
+- voxel_downsample(points, voxel_size) -> points with one point per voxel
+- pose_changed(pose, last_pose, min_move, min_turn) -> bool
+- sector_slices(offsets, sectors) -> beam index slice of each sector
+- sector_min(ranges, slices) -> closest range in each sector
+"""
+import numpy as np
+
+# position of the lidar relative to the robot center
+LIDAR_OFFSET_X = 0.202
+LIDAR_OFFSET_Y = -0.004
+
+
+def scan_to_world(ranges, cos_offsets: np.ndarray, sin_offsets: np.ndarray,
+                  pose, max_range: float) -> np.ndarray:
+    """
+    Convert lidar ranges to world coordinates.
+
+    :param ranges: range of each beam
+    :param cos_offsets: cos of the angle of each beam
+    :param sin_offsets: sin of the angle of each beam
+    :param pose: robot pose (x, y, theta)
+    :param max_range: beams further than this are dropped
+    :return: Nx2 float array of (x, y) world coordinates
+    """
+    robot_points = scan_to_robot(ranges, cos_offsets, sin_offsets, max_range)
+    return robot_to_world(robot_points, pose)
+
+
+def scan_to_robot(ranges, cos_offsets: np.ndarray, sin_offsets: np.ndarray,
+                  max_range: float) -> np.ndarray:
+    """
+    Convert lidar ranges to coordinates relative to the robot center.
+
+    :param ranges: range of each beam
+    :param cos_offsets: cos of the angle of each beam
+    :param sin_offsets: sin of the angle of each beam
+    :param max_range: beams further than this are dropped
+    :return: Nx2 float array of (x, y) robot coordinates
+    """
+    ranges = np.asarray(ranges, dtype=np.float64)
+    # written this way so NaN readings are kept like the original loop did
+    mask = ~(ranges > max_range)
+    rho = ranges[mask]
+
+    # The Webots coordinate system doesn't match the robot-centric axes we're used to
+    robot_points = np.empty((len(rho), 2))
+    robot_points[:, 0] = cos_offsets[mask] * rho + LIDAR_OFFSET_X
+    robot_points[:, 1] = sin_offsets[mask] * rho + LIDAR_OFFSET_Y
+    return robot_points
+
+
+def robot_to_world(points: np.ndarray, pose) -> np.ndarray:
+    """
+    Convert points relative to the robot center to world coordinates.
+
+    :param points: Nx2 float array of (x, y) robot coordinates
+    :param pose: robot pose (x, y, theta)
+    :return: Nx2 float array of (x, y) world coordinates
+    """
+    pose_x, pose_y, pose_theta = pose
+    c, s = np.cos(pose_theta), np.sin(pose_theta)
+    rotation = np.array([[c, s], [-s, c]])
+    world_points = points @ rotation
+    world_points[:, 0] += pose_x
+    world_points[:, 1] += pose_y
+    return world_points
+
+
+def voxel_downsample(points: np.ndarray, voxel_size: float) -> np.ndarray:
+    """
+    Keep only the first point in each square voxel.
+
+    :param points: Nx2 float array of (x, y) points
+    :param voxel_size: width of a voxel in meters
+    :return: Mx2 float array, points are kept in their original order
+    """
+    if len(points) == 0:
+        return points
+
+    cells = np.floor(points / voxel_size).astype(np.int64)
+    # pack both cell indexes into one key, 1d unique is much faster
+    keys = (cells[:, 0] << 32) + cells[:, 1]
+    _, first = np.unique(keys, return_index=True)
+    return points[np.sort(first)]
+
+
+def sector_slices(offsets: np.ndarray, sectors) -> list:
+    """
+    Find the beams in each angular sector, done once so `sector_min` is cheap.
+
+    :param offsets: angle of each beam, sorted in either direction
+    :param sectors: list of (min_angle, max_angle) in radians
+    :return: list of slices into the beams, one per sector
+    """
+    slices = []
+    for min_angle, max_angle in sectors:
+        beams = np.flatnonzero((offsets >= min_angle) & (offsets <= max_angle))
+        if len(beams) == 0:
+            raise ValueError(
+                f'no lidar beams between {min_angle} and {max_angle} rad')
+        slices.append(slice(int(beams[0]), int(beams[-1]) + 1))
+    return slices
+
+
+def sector_min(ranges: np.ndarray, slices: list) -> np.ndarray:
+    """
+    Closest range in each sector.
+
+    NaN readings are ignored, a sector with no returns is `inf`.
+
+    :param ranges: range of each beam
+    :param slices: beam slices from `sector_slices`
+    :return: float array with one distance per sector
+    """
+    closest = np.empty(len(slices))
+    for i, beams in enumerate(slices):
+        closest[i] = np.fmin.reduce(ranges[beams])
+    closest[np.isnan(closest)] = np.inf
+    return closest
+
+
+def pose_changed(pose, last_pose, min_move: float, min_turn: float) -> bool:
+    """
+    Checks if the robot moved or turned enough since `last_pose`.
+
+    :param pose: current pose (x, y, theta)
+    :param last_pose: previous pose (x, y, theta), or None
+    :param min_move: distance in meters that counts as moving
+    :param min_turn: angle in radians that counts as turning
+    """
+    if last_pose is None:
+        return True
+
+    dx = pose[0] - last_pose[0]
+    dy = pose[1] - last_pose[1]
+    # wrap so turning across +-pi is a small change
+    dtheta = (pose[2] - last_pose[2] + np.pi) % (2 * np.pi) - np.pi
+    return dx * dx + dy * dy >= min_move * min_move or abs(dtheta) >= min_turn
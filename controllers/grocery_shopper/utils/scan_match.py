@@ -0,0 +1,157 @@
+"""Scan matching
+
+Aligns lidar scans against an occupancy grid. The grid is turned into a
+distance field once, so matching a scan only needs lookups into it instead
+of searching for the closest obstacle of every point.
+
+This doesn't use webots so it can be used offline and benchmarked.
+
+This file provides:
+- DistanceField(occupied, cell_size, origin) - distance to the closest obstacle
+- match_scan(field, points, pose) -> (pose, quality, information)
+- constrain(pose, prior, information, min_information) -> (pose, constrained)
+"""
+import numpy as np
+from scipy.ndimage import distance_transform_edt
+from utils.scan import robot_to_world
+
+
+class DistanceField:
+    """Distance in meters from any point to the closest occupied cell.
+
+    `occupied[row][col]` is the occupancy grid, a world point `(x, y)` is in
+    cell `col = x / cell_size + origin[0]`, `row = y / cell_size + origin[1]`.
+    Distances are capped at `max_distance`, points further than that from
+    any obstacle are not used for matching.
+    """
+
+    def __init__(self, occupied: np.ndarray, cell_size: float, origin,
+                 max_distance: float = 0.5):
+        occupied = np.asarray(occupied, dtype=bool)
+        if not occupied.any():
+            raise ValueError('occupancy grid has no obstacles to match against')
+
+        self.cell_size = cell_size
+        self.origin = origin
+        self.max_distance = max_distance
+        # measured to the edge of the occupied cells, where the lidar hits them
+        self.distance = np.minimum(
+            np.maximum(distance_transform_edt(~occupied) - 0.5, 0) * cell_size,
+            max_distance)
+
+    def lookup(self, points: np.ndarray):
+        """
+        Bilinear interpolated distance and gradient at each point.
+
+        :param points: Nx2 float array of (x, y) world coordinates
+        :return: (distance, gradient, valid) - N distances, Nx2 gradients and
+        a mask of the points inside the grid
+        """
+        rows, cols = self.distance.shape
+        # shift by half a cell so samples are relative to cell centers
+        u = points[:, 0] / self.cell_size + self.origin[0] - 0.5
+        v = points[:, 1] / self.cell_size + self.origin[1] - 0.5
+        valid = (u >= 0) & (u < cols - 1) & (v >= 0) & (v < rows - 1)
+
+        u0 = np.floor(u).astype(np.intp)
+        v0 = np.floor(v).astype(np.intp)
+        np.clip(u0, 0, cols - 2, out=u0)
+        np.clip(v0, 0, rows - 2, out=v0)
+        fu = np.clip(u - u0, 0, 1)
+        fv = np.clip(v - v0, 0, 1)
+
+        d = self.distance
+        d00 = d[v0, u0]
+        d01 = d[v0, u0 + 1]
+        d10 = d[v0 + 1, u0]
+        d11 = d[v0 + 1, u0 + 1]
+
+        top = d00 + fu * (d01 - d00)
+        bottom = d10 + fu * (d11 - d10)
+        distance = top + fv * (bottom - top)
+
+        gradient = np.empty((len(points), 2))
+        gradient[:, 0] = ((1 - fv) * (d01 - d00) + fv * (d11 - d10)) / self.cell_size
+        gradient[:, 1] = (bottom - top) / self.cell_size
+        distance[~valid] = self.max_distance
+        gradient[~valid] = 0
+        return distance, gradient, valid
+
+
+def match_scan(field: DistanceField, points: np.ndarray, pose, iterations: int = 10,
+               inlier_distance: float = 0.1):
+    """
+    Find the pose that best aligns a scan with the map.
+
+    Minimizes the squared distance field at the scan points with
+    Gauss-Newton, starting from `pose`.
+
+    :param field: distance field of the map
+    :param points: Nx2 float array of scan points relative to the robot center
+    :param pose: initial guess of the robot pose (x, y, theta)
+    :param iterations: maximum number of Gauss-Newton steps
+    :param inlier_distance: points closer than this to an obstacle count as matched
+    :return: (pose, quality, information) - the aligned pose as a 3 float
+    array, the fraction of points that matched, 0 to 1, and the Gauss-Newton
+    `J^T J` at the aligned pose divided by the number of points, a 3x3
+    matrix. Along directions where `information` is small, like down an
+    aisle, moving the pose barely changes the match, so `quality` says
+    nothing about them, see `constrain`.
+    """
+    pose = np.array(pose, dtype=np.float64)
+    if len(points) == 0:
+        return pose, 0.0, np.zeros((3, 3))
+
+    for _ in range(iterations):
+        world = robot_to_world(points, pose)
+        distance, gradient, valid = field.lookup(world)
+        used = valid & (distance < field.max_distance)
+        if used.sum() < 3:
+            break
+
+        jacobian = scan_jacobian(world[used], gradient[used], pose)
+        hessian = jacobian.T @ jacobian + np.eye(3) * 1e-6
+        step = -np.linalg.solve(hessian, jacobian.T @ distance[used])
+
+        pose += step
+        if abs(step[0]) + abs(step[1]) < 1e-4 and abs(step[2]) < 1e-4:
+            break
+
+    world = robot_to_world(points, pose)
+    distance, gradient, valid = field.lookup(world)
+    quality = np.count_nonzero(distance < inlier_distance) / len(points)
+    used = valid & (distance < field.max_distance)
+    jacobian = scan_jacobian(world[used], gradient[used], pose)
+    information = jacobian.T @ jacobian / len(points)
+    return pose, quality, information
+
+
+def scan_jacobian(world: np.ndarray, gradient: np.ndarray, pose) -> np.ndarray:
+    """Nx3 derivative of the distance at each world point by (x, y, theta)."""
+    dx = world[:, 0] - pose[0]
+    dy = world[:, 1] - pose[1]
+    gx, gy = gradient[:, 0], gradient[:, 1]
+    return np.column_stack((gx, gy, gy * dx - gx * dy))
+
+
+def constrain(pose, prior, information: np.ndarray, min_information: float):
+    """
+    Keep the position of `prior` along directions the match doesn't pin down.
+
+    The position of `pose` is only kept along the eigenvectors of the x, y
+    block of `information` with an eigenvalue of at least `min_information`.
+    The distance field gradient is at most about 1, so eigenvalues are below 1,
+    and the smallest is near 0 when the scan only sees the shelves of an aisle.
+
+    :param pose: matched pose (x, y, theta)
+    :param prior: pose to fall back to, such as the GPS
+    :param information: from `match_scan`
+    :return: (pose, constrained) - the constrained pose as a 3 float array and
+    the number of position directions taken from `pose`, 0 to 2
+    """
+    values, vectors = np.linalg.eigh(information[:2, :2])
+    strong = vectors[:, values >= min_information]
+    pose = np.array(pose, dtype=np.float64)
+    prior = np.asarray(prior, dtype=np.float64)
+    pose[:2] = prior[:2] + strong @ (strong.T @ (pose[:2] - prior[:2]))
+    return pose, strong.shape[1]